@@ -1,70 +1,71 @@
 import asyncio
-import sys
 import argparse
+from contextlib import suppress
 from dotenv import load_dotenv
 from src.config import CONFIG
+from src.discord_bot import discord_bot
+from src.fansly import close_session
 from src.monitor import UserMonitor
 from src.ui import UI
-from src.upload import verify_uploaders
+from src.upload import verify_uploaders, close_uploaders
+from src.video import h264_encoder_args
 
 
 load_dotenv()
 
 
-if sys.platform == "win32":
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-
-
 async def main(headless: bool = False):
     if CONFIG.upload_videos:
         await verify_uploaders()
+    await discord_bot.ensure_started()
+
+    # Pick the encoder once, before any stream can go live; detection runs blocking test encodes
+    encoder_args = None
+    if CONFIG.compress_videos:
+        encoder_args = await asyncio.to_thread(h264_encoder_args, CONFIG.video_encoder)
 
     monitors: list[UserMonitor] = []
-    monitoring_tasks = []
     try:
-        for username in CONFIG.users_to_monitor:
-            user_monitor = UserMonitor()
-            await user_monitor.initialize(username)
+        # Initialize all monitors concurrently and drop the ones that failed
+        pending = [UserMonitor(encoder_args) for _ in CONFIG.users_to_monitor]
+        results = await asyncio.gather(
+            *(m.initialize(u) for m, u in zip(pending, CONFIG.users_to_monitor)),
+            return_exceptions=True,
+        )
+        for username, user_monitor, result in zip(CONFIG.users_to_monitor, pending, results):
+            if isinstance(result, Exception):
+                print(f"Failed to initialize monitor for {username}: {result}")
+                continue
             monitors.append(user_monitor)
 
-        # Stagger the start of monitoring with a delay between each user
-        # Use a shorter delay if only a few users are being monitored
-        stagger_delay = min(3, 15 / len(monitors) if monitors else 1)
-        print(f"Starting monitors with {stagger_delay:.1f} second delay between users")
-
-        # Start monitoring for each user with a staggered delay
-        for i, monitor in enumerate(monitors):
-            if i > 0:
-                await asyncio.sleep(stagger_delay)
-            monitoring_tasks.append(asyncio.create_task(monitor.start_monitoring()))
-
-        if not headless:
-            ui_task = asyncio.create_task(UI.start())
-            await asyncio.gather(ui_task, *monitoring_tasks, return_exceptions=True)
-        else:
-            await asyncio.gather(*monitoring_tasks, return_exceptions=True)
+        # The UI has its own lifecycle, so a failure there never cancels the monitors
+        ui_task = asyncio.create_task(UI.start()) if not headless else None
+        try:
+            # The task group cancels and awaits every child when it exits, so no task outlives main()
+            async with asyncio.TaskGroup() as tg:
+                # Each monitor jitters its own first poll, so all can start at once
+                for monitor in monitors:
+                    tg.create_task(monitor.start_monitoring())
+        finally:
+            if ui_task:
+                ui_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await ui_task
 
     except asyncio.CancelledError:
-        await shutdown(monitors, monitoring_tasks)
+        await shutdown(monitors)
     except Exception as e:
         print(f"Unexpected error: {e}")
-        await shutdown(monitors, monitoring_tasks)
+        await shutdown(monitors)
 
 
-async def shutdown(monitors, tasks=None):
+async def shutdown(monitors):
     print("\nShutting down monitors gracefully...")
     await asyncio.gather(*[monitor.stop() for monitor in monitors], return_exceptions=True)
     print("All monitors stopped.")
-
-    # Cancel any remaining tasks
-    if tasks:
-        for task in tasks:
-            if not task.done():
-                task.cancel()
-
-        # Wait for tasks to complete cancellation
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+    await close_session()
+    close_uploaders()
+    await discord_bot.stop()
 
 
 if __name__ == "__main__":
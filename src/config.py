@@ -1,9 +1,17 @@
+import os
+import orjson
 import yaml
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List
 from pathlib import Path
 from src.util import get_base_path
 
+# Prefer the libyaml-backed loader/dumper when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as _YamlLoader, CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader, SafeDumper as _YamlDumper
+
 
 class Config(BaseModel):
     output_directory: Path = Field(
@@ -31,6 +39,10 @@ class Config(BaseModel):
         default=True,
         description="Whether to compress videos during recording",
     )
+    video_encoder: str = Field(
+        default="auto",
+        description="ffmpeg H.264 encoder for compression, or auto to detect hardware",
+    )
     delete_original: bool = Field(
         default=True,
         description="Delete original video file after compression",
@@ -39,6 +51,10 @@ class Config(BaseModel):
         default=True,
         description="Delete split video file after upload",
     )
+    bunkr_parallel_uploads: int = Field(
+        default=3,
+        description="Number of split video parts uploaded to Bunkr at the same time",
+    )
     upload_videos: bool = Field(
         default=False,
         description="Whether to upload videos after recording",
@@ -273,22 +289,50 @@ def get_all_settings() -> Config:
     )
 
 
-def load_config(
-    config_path: Path = Path(__file__).parent.parent / "config.yaml",
-) -> Config:
+CONFIG_PATH = Path(__file__).parent.parent / "config.yaml"
+# Fansly user IDs resolved on earlier runs; kept out of config.yaml so the
+# user's hand-edited file is never rewritten
+USER_ID_CACHE_PATH = get_base_path() / ".user_ids.cache.json"
+
+
+def save_config(config: Config, config_path: Path = CONFIG_PATH):
+    # Write to a temporary file and swap it in so an interrupted write never corrupts the config
+    tmp_path = config_path.with_name(config_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        yaml.dump(config.model_dump(), f, Dumper=_YamlDumper, sort_keys=False)
+    os.replace(tmp_path, config_path)
+
+
+def load_user_id_cache(cache_path: Path = USER_ID_CACHE_PATH) -> Dict[str, str]:
+    """Read the cached user IDs keyed by username, or an empty cache if there is none"""
+    try:
+        cache = orjson.loads(cache_path.read_bytes())
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_user_id_cache(cache: Dict[str, str], cache_path: Path = USER_ID_CACHE_PATH):
+    # Same temporary file swap as save_config
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    tmp_path.write_bytes(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, cache_path)
+
+
+def load_config(config_path: Path = CONFIG_PATH) -> Config:
     config_path.parent.mkdir(parents=True, exist_ok=True)
 
     if config_path.exists():
         with open(config_path, "r") as f:
-            config_dict = yaml.safe_load(f)
+            config_dict = yaml.load(f, Loader=_YamlLoader)
             return Config(**config_dict)
 
     # First-time setup: ask for all settings
     config = get_all_settings()
 
-    with open(config_path, "w") as f:
-        yaml.dump(config.model_dump(), f)
+    save_config(config, config_path)
     return config
 
 
 CONFIG = load_config()
+USER_ID_CACHE = load_user_id_cache()
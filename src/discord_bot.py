@@ -1,17 +1,10 @@
 import os
-import sys
-import threading
 import asyncio
-import queue
-import time
 import discord
+from contextlib import suppress
 from src.config import CONFIG
 
 
-if sys.platform == "win32":
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-
-
 class DiscordBot:
     def __init__(self):
         self.enabled = False
@@ -19,10 +12,11 @@ class DiscordBot:
         self.channel_id = None
         self.client = None
         self.ready = False
-        self.message_queue = queue.Queue()
-        self.loop = None
+        self.message_queue = asyncio.Queue()
         self.last_message = None  # Track the last message sent
-        self.processing_started = False
+        self._start_task = None
+        # Set from on_ready; unlike client.wait_until_ready() it can be awaited before login()
+        self._ready_event = asyncio.Event()
 
         self.enabled = CONFIG.discord_enable
         if self.enabled:
@@ -32,32 +26,23 @@ class DiscordBot:
             @self.client.event
             async def on_ready():
                 self.ready = True
+                self._ready_event.set()
 
     async def _process_messages(self):
-        self.processing_started = True
+        await self._ready_event.wait()
         while True:
             try:
-                if not self.ready:
-                    await asyncio.sleep(1)
-                    continue
-
-                while not self.message_queue.empty():
-                    message = self.message_queue.get_nowait()
-                    channel = self.client.get_channel(int(self.channel_id))
-                    if channel:
-                        try:
-                            # Only send if it's different from the last message
-                            if message != self.last_message:
-                                await channel.send(message)
-                                self.last_message = message
-                        except Exception as e:
-                            print(f"Error sending Discord message: {e}")
-                    else:
-                        print(
-                            f"Channel not found: {self.channel_id}. Is the bot in the server with access to this channel?"
-                        )
-
-                await asyncio.sleep(0.1)
+                message = await self.message_queue.get()
+                channel = self.client.get_channel(int(self.channel_id))
+                if channel:
+                    try:
+                        await channel.send(message)
+                    except Exception as e:
+                        print(f"Error sending Discord message: {e}")
+                else:
+                    print(
+                        f"Channel not found: {self.channel_id}. Is the bot in the server with access to this channel?"
+                    )
             except Exception as e:
                 print(f"Error in Discord message processing: {e}")
                 await asyncio.sleep(1)
@@ -76,8 +61,9 @@ class DiscordBot:
                 )
                 self.enabled = False
 
-    def start(self):
-        if not self.enabled:
+    async def ensure_started(self, timeout: float = 10):
+        """Start the bot on the running event loop and wait until it is ready"""
+        if not self.enabled or self._start_task is not None:
             return
 
         if not self.token:
@@ -85,25 +71,30 @@ class DiscordBot:
             self.enabled = False
             return
 
-        def run_bot():
-            self.loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.loop)
-            self.loop.run_until_complete(self._start_bot())
+        self._start_task = asyncio.create_task(self._start_bot())
 
-        self.bot_thread = threading.Thread(target=run_bot, daemon=True)
-        self.bot_thread.start()
+        # Stop waiting early if the bot fails to start (e.g. invalid token)
+        ready_task = asyncio.create_task(self._ready_event.wait())
+        await asyncio.wait({self._start_task, ready_task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        ready_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await ready_task
 
-        # Wait for the bot to be ready
-        wait_time = 0
-        while not self.processing_started and wait_time < 10:
-            time.sleep(0.5)
-            wait_time += 0.5
+    async def stop(self):
+        if self._start_task is None:
+            return
+        if self.client and not self.client.is_closed():
+            await self.client.close()
+        self._start_task.cancel()
+        await asyncio.gather(self._start_task, return_exceptions=True)
+        self._start_task = None
 
     async def send_message(self, message):
-        if not self.enabled:
+        # Drop repeats at the source so identical bursts never reach the queue
+        if not self.enabled or message == self.last_message:
             return
-        self.message_queue.put(message)
+        self.last_message = message
+        await self.message_queue.put(message)
 
 
 discord_bot = DiscordBot()
-discord_bot.start()
@@ -1,6 +1,7 @@
 import sys
 import aiohttp
 import asyncio
+import orjson
 from dotenv import load_dotenv
 import os
 
@@ -30,6 +31,27 @@ headers = {
 
 BASE_URL = "https://apiv3.fansly.com/api/v1/"
 
+_session: aiohttp.ClientSession | None = None
+
+
+async def _get_session() -> aiohttp.ClientSession:
+    """Return the shared API session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ssl=False, ttl_dns_cache=300),
+            headers=headers,
+        )
+    return _session
+
+
+async def close_session():
+    """Close the shared API session"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
 
 async def fetch_api(endpoint, max_retries: int = 5, initial_delay: float = 1.0):
     retry_count = 0
@@ -37,24 +59,20 @@ async def fetch_api(endpoint, max_retries: int = 5, initial_delay: float = 1.0):
 
     while True:
         try:
-            async with aiohttp.ClientSession(
-                connector=aiohttp.TCPConnector(verify_ssl=False)
-            ) as session:
-                async with session.get(
-                    BASE_URL + endpoint, headers=headers
-                ) as response:
-                    if response.status == 429:
-                        if retry_count >= max_retries:
-                            response.raise_for_status()
-                        retry_count += 1
-                        # Get retry-after header or use exponential backoff
-                        retry_after = float(response.headers.get("Retry-After", delay))
-                        await asyncio.sleep(retry_after)
-                        delay *= 2  # Exponential backoff
-                        continue
-
-                    response.raise_for_status()
-                    return await response.json()
+            session = await _get_session()
+            async with session.get(BASE_URL + endpoint) as response:
+                if response.status == 429:
+                    if retry_count >= max_retries:
+                        response.raise_for_status()
+                    retry_count += 1
+                    # Get retry-after header or use exponential backoff
+                    retry_after = float(response.headers.get("Retry-After", delay))
+                    await asyncio.sleep(retry_after)
+                    delay *= 2  # Exponential backoff
+                    continue
+
+                response.raise_for_status()
+                return await response.json(loads=orjson.loads)
         except aiohttp.ClientError:
             if retry_count >= max_retries:
                 raise
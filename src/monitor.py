@@ -1,74 +1,131 @@
 import asyncio
+import random
 import re
-import subprocess
-import os
 from datetime import datetime
+from pathlib import Path
+from typing import Optional
 from src.fansly import fetch_user_data, fetch_stream_data
-from src.config import CONFIG
+from src.config import CONFIG, USER_ID_CACHE, save_user_id_cache
 from src.video import (
     check_disk_space_and_cleanup,
     auto_create_thumbnail,
+    h264_encoder_args,
 )
 from src.upload import upload_file
 from src.discord_bot import discord_bot
 from src.ui import UI
 
 
+_SANITIZE_RE = re.compile(r"[^\w\-]")
+
+# Upper bound in seconds for the poll interval while a user stays offline
+MAX_OFFLINE_POLL_INTERVAL = 300
+
+# Serializes user ID cache writes so parallel initializations don't race
+_user_id_cache_lock = asyncio.Lock()
+
+
 class UserMonitor:
-    def __init__(self):
+    def __init__(self, encoder_args: Optional[list] = None):
         self.username = None
+        self._sanitized_username = None
         self.user_data = None
         self.user_id = None
         self.is_recording = False
         self.current_output_path = None
+        self._output_dir_created = False
+        self.process = None
         self.ui = None
+        self._last_ui_state = None
         self.discord_bot = discord_bot
-        self._running = True
+        self._stop_event = asyncio.Event()
+        # Stream end handlers run in the background; holding them here keeps them from
+        # being garbage-collected mid-upload and lets stop() wind them down
+        self._tasks: set[asyncio.Task] = set()
+        # Probed once at startup by main(), so a stream going live never waits on it
+        self.encoder_args = encoder_args or h264_encoder_args("libx264")
 
     async def initialize(self, username):
         self.username = username
+        self._sanitized_username = self.sanitize_username(username)
         self.ui = UI
         if self.ui:
             self.ui.add_user(username)
             self.ui.update_user(username, "Fetching user data...")
-        self.user_data = await fetch_user_data(username)
-        self.user_id = self.user_data.get("response")[0].get("id")
+        self.user_id = USER_ID_CACHE.get(username)
+        if not self.user_id:
+            self.user_data = await fetch_user_data(username)
+            self.user_id = self.user_data.get("response")[0].get("id")
+            async with _user_id_cache_lock:
+                if USER_ID_CACHE.get(username) != self.user_id:
+                    USER_ID_CACHE[username] = self.user_id
+                    save_user_id_cache(USER_ID_CACHE)
         if self.ui:
             self.ui.update_user(username, "User data fetched successfully.")
 
     def sanitize_username(self, username):
-        sanitized = re.sub(r"[^\w\-]", "", username)
-        return sanitized.strip("-_")
+        return _SANITIZE_RE.sub("", username).strip("-_")
 
     def update_ui(self, status, recording=None, current_file=None):
         if self.ui:
+            recording = recording if recording is not None else False
+            current_file = current_file if current_file is not None else ""
+            # Skip the redraw when nothing visible has changed
+            state = (status, recording, current_file)
+            if state == self._last_ui_state:
+                return
+            self._last_ui_state = state
             self.ui.update_user(
                 self.username if self.username is not None else "",
                 status,
-                recording=recording if recording is not None else False,
-                current_file=current_file if current_file is not None else "",
+                recording=recording,
+                current_file=current_file,
             )
 
+    async def _sleep(self, seconds):
+        """Sleep for the given time, waking up early if the monitor is stopped"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
     async def stop(self):
-        self._running = False
+        self._stop_event.set()
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
 
     async def start_monitoring(self):
         if not self.user_id:
             raise RuntimeError("UserMonitor must be initialized first")
 
-        while self._running:
+        # Spread the first poll of each user to avoid bursting the API at startup
+        await self._sleep(random.random() * min(CONFIG.check_interval, 15))
+
+        offline_streak = 0
+        while not self._stop_event.is_set():
             try:
                 if self.is_recording:
-                    await asyncio.sleep(CONFIG.check_interval)
+                    await self._sleep(CONFIG.check_interval)
                     continue
 
                 stream_data = await fetch_stream_data(self.user_id)
                 if stream_data.get("access") and stream_data.get("playbackUrl"):
+                    offline_streak = 0
                     await self.start_recording(stream_data["playbackUrl"])
+                    sleep_for = CONFIG.check_interval
                 else:
                     self.update_ui("Waiting for stream...", recording=False)
-
-                await asyncio.sleep(CONFIG.check_interval)
+                    # Back off exponentially while the user stays offline
+                    sleep_for = min(
+                        CONFIG.check_interval * 2 ** min(offline_streak, 3),
+                        max(MAX_OFFLINE_POLL_INTERVAL, CONFIG.check_interval),
+                    )
+                    offline_streak += 1
+
+                await self._sleep(sleep_for)
             except asyncio.CancelledError:
                 await self.stop()
                 break
@@ -87,18 +144,18 @@ class UserMonitor:
 
         await self.discord_bot.send_message(f"🔴 {self.username}: Stream Starting")
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        sanitized_username = self.sanitize_username(self.username)
-        output_path = os.path.join(
-            CONFIG.output_directory,
-            sanitized_username,
-            f"{sanitized_username}_{timestamp}.mp4",
+        sanitized_username = self._sanitized_username
+        output_path = (
+            Path(CONFIG.output_directory)
+            / sanitized_username
+            / f"{sanitized_username}_{timestamp}.mp4"
         )
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if not self._output_dir_created:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            self._output_dir_created = True
 
         self.current_output_path = output_path
-        self.update_ui(
-            "Recording", recording=True, current_file=os.path.basename(output_path)
-        )
+        self.update_ui("Recording", recording=True, current_file=output_path.name)
 
         ffmpeg_cmd = []
         if CONFIG.compress_videos:
@@ -108,19 +165,14 @@ class UserMonitor:
                 "quiet",
                 "-i",
                 url,
-                "-c:v",
-                "libx264",
-                "-preset",
-                "veryfast",
-                "-crf",
-                "26",
+                *self.encoder_args,
                 "-c:a",
                 "aac",
                 "-b:a",
                 "128k",
                 "-movflags",
                 "+frag_keyframe+empty_moov",
-                output_path,
+                str(output_path),
             ]
         else:
             ffmpeg_cmd = [
@@ -133,7 +185,7 @@ class UserMonitor:
                 "copy",
                 "-f",
                 "mp4",
-                output_path,
+                str(output_path),
             ]
         if CONFIG.dev_mode:
             ffmpeg_cmd.insert(-1, "-t")
@@ -141,14 +193,18 @@ class UserMonitor:
             print("TESTING MODE: Recording for only 60 seconds")
 
         try:
-            process = subprocess.Popen(
-                ffmpeg_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            self.process = await asyncio.create_subprocess_exec(
+                *ffmpeg_cmd,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
             )
             self.is_recording = True
-            while process.poll() is None:
-                await asyncio.sleep(1)
+            await self.process.wait()
+            self.process = None
 
-            asyncio.create_task(self.handle_stream_end())
+            task = asyncio.create_task(self.handle_stream_end())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
         except Exception as e:
             print(f"Error recording stream: {str(e)}")
             self.is_recording = False
@@ -163,37 +219,47 @@ class UserMonitor:
             return
 
         thumbnail_path = None
-        if not os.path.exists(video_path):
+        if not video_path.exists():
             print(f"Video file {video_path} does not exist")
             return
 
         if CONFIG.generate_thumbnail:
-            thumbnail_name = os.path.splitext(video_path)[0] + ".jpg"
-            auto_create_thumbnail(video_path, thumbnail_name)
-            thumbnail_path = thumbnail_name
+            thumbnail_path = str(video_path.with_suffix(".jpg"))
+            # Decoding frames is blocking work; keep it off the event loop
+            await asyncio.to_thread(
+                auto_create_thumbnail, str(video_path), thumbnail_path
+            )
 
         videos = []
         thumbnail_url = None
         if CONFIG.upload_videos:
-            if video_path:
-                video_uploads = await asyncio.gather(
-                    upload_file(video_path, "bunkr"), upload_file(video_path, "gofile")
-                )
-                videos.extend(
-                    [
-                        {"service": "bunkr", "result": video_uploads[0]},
-                        {"service": "gofile", "result": video_uploads[1]},
-                    ]
-                )
+            # Run every video and thumbnail upload in a single gather
+            uploads = [
+                ("video", "bunkr", video_path),
+                ("video", "gofile", video_path),
+            ]
+            if thumbnail_path:
+                uploads += [
+                    ("thumb", "jpg5", thumbnail_path),
+                    ("thumb", "bunkr", thumbnail_path),
+                ]
+            results = await asyncio.gather(
+                *(upload_file(str(path), service) for _, service, path in uploads),
+                return_exceptions=True,
+            )
+
+            thumbnail_results = {}
+            for (kind, service, _), result in zip(uploads, results):
+                if isinstance(result, BaseException):
+                    result = {"success": False, "url": None, "error": str(result)}
+                if kind == "video":
+                    videos.append({"service": service, "result": result})
+                else:
+                    thumbnail_results[service] = result
 
             if thumbnail_path:
-                thumbnail_uploads = await asyncio.gather(
-                    upload_file(thumbnail_path, "jpg5"),
-                    upload_file(thumbnail_path, "bunkr"),
-                )
-                # Fixed: properly extract URL from the result dictionary
-                jpg5_result = thumbnail_uploads[0]
-                bunkr_result = thumbnail_uploads[1]
+                jpg5_result = thumbnail_results.get("jpg5")
+                bunkr_result = thumbnail_results.get("bunkr")
 
                 # Check if jpg5 upload was successful and has a URL
                 if (
@@ -217,18 +283,20 @@ class UserMonitor:
 
             if CONFIG.discord_enable:
                 await self.send_end_message(videos, thumbnail_url=thumbnail_url)
-            self.save_upload_results(videos, thumbnail_url=thumbnail_url)
-        self.update_ui("Stream ended", recording=False, current_file=None)
-        self.current_output_path = None
+            self.save_upload_results(video_path, videos, thumbnail_url=thumbnail_url)
+        # A new recording may have started while this one was uploading;
+        # leave its state alone
+        if self.current_output_path == video_path:
+            self.update_ui("Stream ended", recording=False, current_file=None)
+            self.current_output_path = None
 
     async def send_end_message(self, videos, thumbnail_url=None):
-        discord_msg = "🟢 Upload finished.\n```\n"
         current_date = datetime.now().strftime("%b %d %Y")
-        discord_msg += f"{current_date}\n"
+        parts = ["🟢 Upload finished.\n```\n", f"{current_date}\n"]
         if thumbnail_url:
-            discord_msg += f"[IMG]{thumbnail_url}[/IMG]\n"
+            parts.append(f"[IMG]{thumbnail_url}[/IMG]\n")
         else:
-            discord_msg += "\n"
+            parts.append("\n")
         if videos:
             sorted_uploads = sorted(
                 videos,
@@ -238,38 +306,38 @@ class UserMonitor:
             for upload in sorted_uploads:
                 result = upload["result"]
                 if result.get("multiple") and "urls" in result:
-                    for idx, url in enumerate(result["urls"]):
-                        discord_msg += f"{url}\n"
+                    for url in result["urls"]:
+                        parts.append(f"{url}\n")
                 else:
                     url = result.get("url", "No URL provided")
-                    discord_msg += f"{url}\n"
-        discord_msg += "```"
-        await self.discord_bot.send_message(discord_msg)
+                    parts.append(f"{url}\n")
+        parts.append("```")
+        await self.discord_bot.send_message("".join(parts))
 
-    def save_upload_results(self, videos, thumbnail_url=None):
+    def save_upload_results(self, video_path, videos, thumbnail_url=None):
         current_date = datetime.now().strftime("%b %d %Y")
-        if self.current_output_path:
-            txt_file_path = os.path.splitext(self.current_output_path)[0] + ".txt"
-            txt_content = f"{current_date}\n\n"
+        if video_path:
+            txt_file_path = video_path.with_suffix(".txt")
+            parts = [f"{current_date}\n\n"]
 
             if thumbnail_url:
-                txt_content += f"Thumbnail: {thumbnail_url}\n\n"
+                parts.append(f"Thumbnail: {thumbnail_url}\n\n")
             if videos:
-                txt_content += "Video Links:\n"
+                parts.append("Video Links:\n")
                 for upload in videos:
                     result = upload["result"]
                     service_name = upload["service"].capitalize()
 
                     if result.get("multiple") and "urls" in result:
                         for idx, url in enumerate(result["urls"]):
-                            txt_content += f"{service_name} {idx + 1}: {url}\n"
+                            parts.append(f"{service_name} {idx + 1}: {url}\n")
                     else:
                         url = result.get("url", "No URL provided")
-                        txt_content += f"{service_name}: {url}\n"
+                        parts.append(f"{service_name}: {url}\n")
 
             try:
                 with open(txt_file_path, "w", encoding="utf-8") as f:
-                    f.write(txt_content)
+                    f.write("".join(parts))
                 print(f"Saved upload information to {txt_file_path}")
             except Exception as e:
                 print(f"Failed to save upload information: {str(e)}")
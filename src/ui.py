@@ -1,32 +1,119 @@
 import asyncio
-import requests
-import base64
+import aiohttp
+import orjson
+import time
+from contextlib import suppress
 from rich.live import Live
 from rich.table import Table
-from rich.console import Console
 from rich.text import Text
 from datetime import datetime, timedelta
-from typing import Dict
+from itertools import islice, zip_longest
+from typing import Dict, Optional
+from src.util import get_base_path
+
+
+VERSION_URL = "https://api.github.com/repos/tomatbasil/FanslyStreamRecorder/contents/.ver"
+VERSION_CHECK_INTERVAL = timedelta(days=1)
+# How soon to try again after a failed version check
+VERSION_RETRY_INTERVAL = timedelta(minutes=15)
+# Latest version check result, kept across restarts
+VERSION_CACHE_PATH = get_base_path() / ".ver.cache.json"
+# Maximum number of idle (not recording) users shown in the table
+MAX_IDLE_ROWS = 20
+# Seconds between display rebuilds, matching the Live refresh rate
+REFRESH_INTERVAL = 0.25
+
+# Shared recording-status cells, never mutated
+_LIVE_CELL = Text("🔴 LIVE", style="bold red")
+_IDLE_CELL = Text("⚫", style="dim")
+
+
+def _parse_version(version: str) -> tuple[int, ...]:
+    """Parse a version like "0.1.0" into its numeric components, or () if it can't be parsed"""
+    try:
+        return tuple(int(x) for x in version.strip().split("."))
+    except ValueError:
+        return ()
+
+
+def _compare_versions(current: tuple[int, ...], latest: tuple[int, ...]) -> int:
+    """
+    Compare parsed version numbers and return a status code:
+    0: Same or up to date
+    1: Close (minor version difference)
+    2: Far behind (major version difference)
+    """
+    if not current or not latest:
+        return 1  # Default to yellow if can't compare
+    if current == latest:
+        return 0
+
+    # Pad with zeros if one version has fewer components
+    pairs = list(zip_longest(current, latest, fillvalue=0))
+
+    # If versions are the same, return green
+    if all(c == l for c, l in pairs):
+        return 0
+
+    # If major version is different, return red
+    if pairs[0][0] != pairs[0][1]:
+        return 2
+
+    # If only minor or patch versions are different, return yellow
+    return 1
+
+
+def _version_text(current: str, latest: str, status: int) -> Text:
+    """Return richly formatted version text based on comparison status"""
+    current_text = Text(current)
+    latest_text = Text(latest)
+
+    # Apply color to current version
+    if status == 0:
+        current_text.stylize("bold green")
+    elif status == 1:
+        current_text.stylize("bold yellow")
+    else:
+        current_text.stylize("bold red")
+
+    # Apply color to latest version
+    latest_text.stylize("bold green")
+
+    return Text.assemble("Fansly Stream Monitor | Version: ", current_text, " | Latest: ", latest_text)
 
 
 class MonitorUI:
     def __init__(self):
-        self.console = Console()
         self.user_states: Dict[str, dict] = {}
         self.live = None
+        self._dirty = False
+        self._refresh_handle: Optional[asyncio.TimerHandle] = None
+        self._table: Optional[Table] = None
+        self._display: Optional[Table] = None
+        self._rows_dirty: set[str] = set()
+        self._recording: set[str] = set()
         self.latest_version_cache = None
         self.latest_version_cache_time = None
+        self._latest_etag = None
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._current_version = self._read_current_version()
+        self._current_version_tuple = _parse_version(self._current_version)
+        self._latest_version_tuple = ()
+        self._load_version_cache()
+        self._update_version_text()
 
     def add_user(self, username: str):
         """Add a new user to the monitoring UI"""
         self.user_states[username] = {
             "status": "Initializing...",
             "recording": False,
-            "last_update": datetime.now(),
+            # Only the formatted time is displayed, so no datetime is kept around
+            "last_update_str": time.strftime("%H:%M:%S"),
             "current_file": None,
         }
-        if self.live:
-            self.refresh()
+        # A new row changes the table shape, so force a full rebuild
+        self._table = None
+        self._mark_dirty()
 
     def update_user(
         self,
@@ -38,107 +125,137 @@ class MonitorUI:
         """Update the status of a monitored user"""
         if username in self.user_states:
             self.user_states[username]["status"] = status
-            self.user_states[username]["last_update"] = datetime.now()
+            self.user_states[username]["last_update_str"] = time.strftime("%H:%M:%S")
             if recording is not None:
                 self.user_states[username]["recording"] = recording
+                # Recording users are listed first, so a flip reorders the table
+                if recording and username not in self._recording:
+                    self._recording.add(username)
+                    self._table = None
+                elif not recording and username in self._recording:
+                    self._recording.discard(username)
+                    self._table = None
             if current_file is not None:
                 self.user_states[username]["current_file"] = current_file
-            self.refresh()
+            self._rows_dirty.add(username)
+            self._mark_dirty()
 
-    def get_version(self) -> tuple[str, str]:
-        """Get the version of the application"""
-        current_version = "unknown"
+    def _read_current_version(self) -> str:
+        """Read the installed version from the .ver file"""
         try:
-            with open(".ver", "r") as f:
-                version_content = f.read().strip()
-                current_version = version_content
-        except (FileNotFoundError, IOError):
+            return (get_base_path() / ".ver").read_text().strip()
+        except OSError:
             print("Version file not found. Using 'unknown' as version.")
+            return "unknown"
 
-        # Check if we have a cached version and if it's still valid (less than 24 hours old)
-        if (
-            self.latest_version_cache
-            and self.latest_version_cache_time
-            and datetime.now() - self.latest_version_cache_time < timedelta(days=1)
-        ):
-            return current_version, self.latest_version_cache
+    def get_version(self) -> tuple[str, str]:
+        """Get the current and latest known version of the application"""
+        # The latest version is fetched in the background by _version_refresh_loop
+        return self._current_version, self.latest_version_cache or "unknown"
 
-        # If no cache or cache expired, fetch from GitHub
-        latest_version = "unknown"
+    def _load_version_cache(self):
+        """Restore the last version check from disk, if there is one"""
         try:
-            response = requests.get("https://api.github.com/repos/tomatbasil/FanslyStreamRecorder/contents/.ver")
-            if response.status_code == 200:
-                version_content = response.json().get("content", "unknown")
-                latest_version = base64.b64decode(version_content).decode("utf-8").strip()
-                # Update cache
-                self.latest_version_cache = latest_version
-                self.latest_version_cache_time = datetime.now()
-        except Exception:
-            # If request fails, use cached version if available
-            if self.latest_version_cache:
-                latest_version = self.latest_version_cache
-            return current_version, latest_version
-
-        return current_version, latest_version
-
-    def _compare_versions(self, current: str, latest: str) -> int:
-        """
-        Compare version numbers and return a status code:
-        0: Same or up to date
-        1: Close (minor version difference)
-        2: Far behind (major version difference)
-        """
-        if current == "unknown" or latest == "unknown":
-            return 1  # Default to yellow if can't compare
+            cache = orjson.loads(VERSION_CACHE_PATH.read_bytes())
+            self.latest_version_cache = cache["latest"]
+            self.latest_version_cache_time = datetime.fromisoformat(cache["time"])
+            self._latest_etag = cache.get("etag")
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self._latest_version_tuple = _parse_version(self.latest_version_cache)
 
+    def _save_version_cache(self):
+        """Write the last version check to disk"""
+        cache = {
+            "latest": self.latest_version_cache,
+            "time": self.latest_version_cache_time.isoformat(),
+            "etag": self._latest_etag,
+        }
         try:
-            # Parse versions like "0.1.0" into components
-            current_parts = [int(x) for x in current.strip().split(".")]
-            latest_parts = [int(x) for x in latest.strip().split(".")]
+            VERSION_CACHE_PATH.write_bytes(orjson.dumps(cache))
+        except OSError:
+            pass
 
-            # Pad with zeros if one version has fewer components
-            while len(current_parts) < len(latest_parts):
-                current_parts.append(0)
-            while len(latest_parts) < len(current_parts):
-                latest_parts.append(0)
+    def _seconds_until_version_check(self) -> float:
+        """Time left before the cached latest version expires"""
+        if self.latest_version_cache_time is None:
+            return 0
+        remaining = VERSION_CHECK_INTERVAL - (datetime.now() - self.latest_version_cache_time)
+        return max(remaining.total_seconds(), 0)
 
-            # If versions are the same, return green
-            if current_parts == latest_parts:
-                return 0
-
-            # If major version is different, return red
-            if current_parts[0] != latest_parts[0]:
-                return 2
-
-            # If only minor or patch versions are different, return yellow
-            return 1
-        except (ValueError, IndexError):
-            return 1  # Default to yellow if parsing fails
-
-    def _get_version_text(self, current: str, latest: str) -> Text:
-        """Return richly formatted version text based on comparison"""
-        status = self._compare_versions(current, latest)
+    def _update_version_text(self):
+        """Rebuild the table title; only needed when the latest version changes"""
+        current_version, latest_version = self.get_version()
+        status = _compare_versions(self._current_version_tuple, self._latest_version_tuple)
+        # Shared between frames, so it must not be mutated
+        self._version_text = _version_text(current_version, latest_version, status)
 
-        current_text = Text(current)
-        latest_text = Text(latest)
+    async def _refresh_latest_version(self):
+        """Fetch the latest version from GitHub and store it in the cache"""
+        # Ask for the raw file instead of the base64-encoded JSON blob
+        headers = {"User-Agent": "FanslyStreamRecorder", "Accept": "application/vnd.github.raw"}
+        # A conditional request answered with 304 doesn't count against GitHub's rate limit
+        if self._latest_etag:
+            headers["If-None-Match"] = self._latest_etag
+        try:
+            async with self._http.get(VERSION_URL, headers=headers) as response:
+                if response.status == 304:
+                    self.latest_version_cache_time = datetime.now()
+                    self._save_version_cache()
+                elif response.status == 200:
+                    self._latest_etag = response.headers.get("ETag")
+                    self.latest_version_cache = (await response.text()).strip()
+                    self._latest_version_tuple = _parse_version(self.latest_version_cache)
+                    self.latest_version_cache_time = datetime.now()
+                    self._save_version_cache()
+                    self._update_version_text()
+                    self._mark_dirty()
+        except Exception:
+            # Keep the cached version (if any) when the request fails
+            pass
 
-        # Apply color to current version
-        if status == 0:
-            current_text.stylize("bold green")
-        elif status == 1:
-            current_text.stylize("bold yellow")
-        else:
-            current_text.stylize("bold red")
+    async def _version_refresh_loop(self):
+        """Re-check the latest version whenever the cached one is older than VERSION_CHECK_INTERVAL"""
+        # Without a local version there is nothing to compare against
+        if self._current_version == "unknown":
+            return
 
-        # Apply color to latest version
-        latest_text.stylize("bold green")
+        # One pooled keep-alive connection is enough for a single periodic request
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=1),
+            # Fail fast so an unreachable GitHub is just retried later
+            timeout=aiohttp.ClientTimeout(total=5, sock_connect=2, sock_read=3),
+        ) as self._http:
+            while True:
+                delay = self._seconds_until_version_check()
+                if not delay:
+                    await self._refresh_latest_version()
+                    # A failed check leaves the cache time untouched, so it is retried sooner
+                    delay = self._seconds_until_version_check() or VERSION_RETRY_INTERVAL.total_seconds()
+                await asyncio.sleep(delay)
 
-        return Text.assemble("Fansly Stream Monitor | Version: ", current_text, " | Latest: ", latest_text)
+    def _fill_row_cells(self, state: dict):
+        """Write a user's state into the row's cached Text cells"""
+        status, recording, current_file, last_update = state["_cells"]
+        status.plain = state["status"]
+        recording_cell = _LIVE_CELL if state["recording"] else _IDLE_CELL
+        recording.plain, recording.style = recording_cell.plain, recording_cell.style
+        current_file.plain = state["current_file"] or "-"
+        last_update.plain = state["last_update_str"]
 
     def generate_streams_table(self) -> Table:
-        """Generate the stream monitoring table"""
-        current_version, latest_version = self.get_version()
-        version_text = self._get_version_text(current_version, latest_version)
+        """Generate the stream monitoring table, reusing the previous one when no users were added"""
+        version_text = self._version_text
+
+        if self._table is not None:
+            # Only the rows that changed need their cells rewritten
+            self._table.title = version_text
+            for username in self._rows_dirty:
+                state = self.user_states[username]
+                if state["_cells"]:
+                    self._fill_row_cells(state)
+            self._rows_dirty.clear()
+            return self._table
 
         table = Table(title=version_text)
 
@@ -149,14 +266,24 @@ class MonitorUI:
         table.add_column("Current File")
         table.add_column("Last Update", justify="right")
 
-        # Add user rows
-        for username, state in self.user_states.items():
-            recording_status = Text("🔴 LIVE", style="bold red") if state["recording"] else Text("⚫", style="dim")
-            current_file = state["current_file"] or "-"
-            last_update = state["last_update"].strftime("%H:%M:%S")
+        # Add recording users first, then a bounded number of idle ones
+        for state in self.user_states.values():
+            state["_cells"] = None
+        recording_users = [u for u in self.user_states if u in self._recording]
+        idle_users = (u for u in self.user_states if u not in self._recording)
+        shown_users = recording_users + list(islice(idle_users, MAX_IDLE_ROWS))
+        for username in shown_users:
+            state = self.user_states[username]
+            state["_cells"] = (Text(), Text(), Text(), Text())
+            self._fill_row_cells(state)
+            table.add_row(username, *state["_cells"])
 
-            table.add_row(username, state["status"], recording_status, current_file, last_update)
+        hidden_count = len(self.user_states) - len(shown_users)
+        if hidden_count:
+            table.caption = f"{hidden_count} more idle user(s) not shown"
 
+        self._table = table
+        self._rows_dirty.clear()
         return table
 
     def generate_display(self):
@@ -164,20 +291,37 @@ class MonitorUI:
         # Just return the streams table, no compression queue
         return self.generate_streams_table()
 
+    def _mark_dirty(self):
+        """Flag the display for a rebuild, coalescing bursts of updates into a single redraw"""
+        self._dirty = True
+        if self.live and self._refresh_handle is None:
+            self._refresh_handle = asyncio.get_running_loop().call_later(REFRESH_INTERVAL, self._scheduled_refresh)
+
+    def _scheduled_refresh(self):
+        self._refresh_handle = None
+        self.refresh()
+
     def refresh(self):
-        """Refresh the display"""
-        if self.live:
-            self.live.update(self.generate_display())
+        """Rebuild the display if anything changed since the last rebuild"""
+        if self.live and self._dirty:
+            self._dirty = False
+            self._display = self.generate_display()
+            # Live has no refresh thread, so the cached cells are never rendered while being edited
+            self.live.update(self._display, refresh=True)
 
     async def start(self):
         """Start the live display"""
-        self.live = Live(self.generate_display(), refresh_per_second=4)
+        version_task = asyncio.create_task(self._version_refresh_loop())
+        # Redrawn from the event loop only when state changes, so rebuilding and rendering never overlap
+        self._display = self.generate_display()
+        self.live = Live(self._display, auto_refresh=False)
         self.live.start()
         try:
-            while True:
-                await asyncio.sleep(0.25)
-                self.refresh()
+            await asyncio.Event().wait()
         except asyncio.CancelledError:
+            version_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await version_task
             self.live.stop()
 
 
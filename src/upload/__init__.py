@@ -1,6 +1,7 @@
-from src.upload.upload import upload_file, verify_uploaders
+from src.upload.upload import upload_file, verify_uploaders, close_uploaders
 
 __all__ = [
     "upload_file",
     "verify_uploaders",
+    "close_uploaders",
 ]
@@ -2,10 +2,21 @@ import mimetypes
 import os
 import math
 import uuid
-import requests
-from typing import TypedDict, Optional, List, Dict, Any
+import orjson
+import threading
+import time
+from typing import TypedDict, Optional, List, Dict, Any, Callable
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
+from src.upload.multipart import FileSliceBody, file_part_prefix, form_field_prefix, open_for_slicing
+from src.upload.session import backoff_delay, create_session, read_json
+
+
+@lru_cache(maxsize=None)
+def _content_type_for(extension: str) -> str:
+    """Guess the MIME type for a lowercase file extension, defaulting to a generic binary type."""
+    return mimetypes.guess_type(f"file{extension}")[0] or "application/octet-stream"
 
 
 class ChunkSizeConfig(TypedDict):
@@ -73,6 +84,7 @@ class BunkrUploader:
         token (str): The API token for authentication with Bunkr.cr.
         chunk_size (int): Maximum size in bytes for each chunk during upload (default: 25MB).
         headers (dict): HTTP headers used for API requests.
+        session (requests.Session): Keep-alive session carrying the headers above.
         verify (VerifyResponse): Response from token verification.
         check (BunkrConfig): Server configuration and limits.
         node (NodeResponse): Upload node information.
@@ -89,6 +101,7 @@ class BunkrUploader:
     """
 
     MAX_RETRIES = 3  # Add this constant after the class definition
+    ALBUM_CACHE_TTL = 30  # Seconds the album list is reused between lookups
 
     def __init__(self, token: str, config={"chunk_size": 25000000, "silent": False}) -> None:
         """
@@ -98,10 +111,16 @@ class BunkrUploader:
         :param config: A dictionary containing configuration options:
                       - chunk_size: Maximum size (in bytes) for each chunk.
                       - silent: If True, suppress progress bars.
+                      - parallel_chunks: Number of chunks of one file uploaded at once (default: 1).
+                        Only raise this if the node accepts chunks out of order.
         """
         self.token = token
         self.chunk_size = config.get("chunk_size", 25000000)
         self.silent = config.get("silent", False)
+        self.parallel_chunks = max(1, config.get("parallel_chunks", 1))
+        self._albums: Optional[List[Dict[str, Any]]] = None
+        self._albums_by_name: Dict[str, Dict[str, Any]] = {}
+        self._albums_time = 0.0
         self.headers = {
             "token": self.token,
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:135.0) Gecko/20100101 Firefox/135.0",
@@ -112,16 +131,27 @@ class BunkrUploader:
             "X-Requested-With": "XMLHttpRequest",
             "Origin": "https://dash.bunkr.cr",
         }
-        self.verify: VerifyResponse = requests.post(
-            "https://dash.bunkr.cr/api/tokens/verify",
-            headers=self.headers,
-            data={"token": self.token},
-        ).json()
+        # Reuse keep-alive connections across API calls, chunks and parallel uploads;
+        # transient failures of idempotent requests are retried with backoff by the session itself
+        self.session = create_session(self.MAX_RETRIES)
+        self.session.headers.update(self.headers)
+
+        # The three startup lookups don't depend on each other, so run them concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            verify_future = executor.submit(
+                self.session.post,
+                "https://dash.bunkr.cr/api/tokens/verify",
+                data={"token": self.token},
+            )
+            check_future = executor.submit(self.session.get, "https://dash.bunkr.cr/api/check")
+            node_future = executor.submit(self.session.get, "https://dash.bunkr.cr/api/node")
+
+        self.verify: VerifyResponse = read_json(verify_future.result())
         if not self.verify.get("success"):
             raise ValueError("Invalid API token.")
 
-        self.check: BunkrConfig = requests.get("https://dash.bunkr.cr/api/check").json()
-        self.node: NodeResponse = requests.get("https://dash.bunkr.cr/api/node", headers=self.headers).json()
+        self.check: BunkrConfig = read_json(check_future.result())
+        self.node: NodeResponse = read_json(node_future.result())
         self.upload_url = self.node.get("url")
         self.max_file_size = self._str_to_size(self.check.get("maxSize", "2000MB"))
 
@@ -152,7 +182,7 @@ class BunkrUploader:
         """
         Refresh the upload URL from the server.
         """
-        self.node = requests.get("https://dash.bunkr.cr/api/node", headers=self.headers).json()
+        self.node = read_json(self.session.get("https://dash.bunkr.cr/api/node"))
         self.upload_url = self.node.get("url")
 
     def get_albums(self) -> List[Dict[str, Any]]:
@@ -161,9 +191,16 @@ class BunkrUploader:
 
         :return: A list of album objects.
         """
-        response = requests.get("https://dash.bunkr.cr/api/albums", headers=self.headers)
+        # Batches of uploads to the same album share one request
+        if self._albums is not None and time.monotonic() - self._albums_time < self.ALBUM_CACHE_TTL:
+            return self._albums
+
+        response = self.session.get("https://dash.bunkr.cr/api/albums")
         if response.status_code == 200:
-            return response.json().get("albums", [])
+            self._albums = read_json(response).get("albums", [])
+            self._albums_by_name = {album.get("name").lower(): album for album in reversed(self._albums)}
+            self._albums_time = time.monotonic()
+            return self._albums
         return []
 
     def get_album_by_name(self, album_name: str) -> Optional[Dict[str, Any]]:
@@ -173,11 +210,9 @@ class BunkrUploader:
         :param album_name: The name of the album to search for.
         :return: The album object if found, None otherwise.
         """
-        albums = self.get_albums()
-        for album in albums:
-            if album.get("name").lower() == album_name.lower():
-                return album
-        return None
+        if not self.get_albums():
+            return None
+        return self._albums_by_name.get(album_name.lower())
 
     def get_album_id_by_name(self, album_name: str) -> Optional[str]:
         """
@@ -205,10 +240,9 @@ class BunkrUploader:
         # New validations using self.check
         total_filesize = os.path.getsize(file_path)
 
-        max_size_str = self.check.get("maxSize", "2000MB")
-        max_size_bytes = self._str_to_size(max_size_str)
-        if total_filesize > max_size_bytes:
-            print(f"File size {total_filesize} exceeds maximum allowed size of {max_size_bytes} bytes.")
+        # max_file_size is parsed from self.check once in __init__
+        if total_filesize > self.max_file_size:
+            print(f"File size {total_filesize} exceeds maximum allowed size of {self.max_file_size} bytes.")
             return False
         return True
 
@@ -219,52 +253,132 @@ class BunkrUploader:
         content_type: str,
         album_id: Optional[str] = None,
     ) -> Optional[str]:
-        if self.silent:
-            # No progress bar in silent mode
-            with open(file_path, "rb") as f:
-                files = {"files[]": (os.path.basename(file_path), f, content_type)}
-                request_headers = self.headers.copy()
-                request_headers["albumid"] = album_id if album_id else ""
+        filename = os.path.basename(file_path)
+        boundary = f"----geckoformboundary{uuid.uuid4().hex[:24]}"
+        request_headers = {
+            "albumid": album_id if album_id else "",
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+        }
+        head = file_part_prefix(boundary, "files[]", filename, content_type)
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        # No progress bar in silent mode
+        pbar = None
+        if not self.silent:
+            pbar = tqdm(total=total_filesize, unit="B", unit_scale=True, desc=f"Uploading {filename}")
+        try:
+            # Stream the file from disk; files= would make requests read all of it into memory first
+            with open_for_slicing(file_path) as f:
+                payload = FileSliceBody(head, f, 0, total_filesize, tail)
+                response = self.session.post(self.upload_url, data=payload, headers=request_headers)
+            if pbar:
+                pbar.update(total_filesize)
+        finally:
+            if pbar:
+                pbar.close()
+
+        if response.status_code == 200:
+            response_data = read_json(response)
+            if response_data.get("success"):
+                files_data = response_data.get("files", [])
+                if files_data and len(files_data) > 0:
+                    file_url = files_data[0].get("url")
+                    return file_url
+        else:
+            print(f"Error uploading file: HTTP {response.status_code}")
+            print("Response:", response.text)
+            return None
+
+    def _upload_one_chunk(
+        self,
+        f,
+        file_lock: threading.Lock,
+        upload_url: str,
+        upload_headers: Dict[str, str],
+        form_head: Callable[[int, int], bytearray],
+        end_boundary: bytes,
+        total_filesize: int,
+        chunk_index: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Upload a single chunk, retrying with backoff so one failed chunk doesn't restart the whole file.
 
-                response = requests.post(self.upload_url, files=files, headers=request_headers)
+        :return: The server response for the chunk, or None if every attempt failed.
+        """
+        chunk_byte_offset = chunk_index * self.chunk_size
+        chunk_length = min(self.chunk_size, total_filesize - chunk_byte_offset)
+        form_bytes = form_head(chunk_index, chunk_byte_offset)
+
+        retries = 0
+        while retries < self.MAX_RETRIES:
+            try:
+                # Stream the chunk from disk between the form header and end boundary.
+                # The body restarts from its offset whenever it is iterated, so it can be resent.
+                payload = FileSliceBody(form_bytes, f, chunk_byte_offset, chunk_length, end_boundary, file_lock)
+                response = self.session.post(upload_url, data=payload, headers=upload_headers)
 
                 if response.status_code == 200:
-                    response_data = response.json()
-                    if response_data.get("success"):
-                        files_data = response_data.get("files", [])
+                    return read_json(response)
+                raise Exception(f"HTTP {response.status_code}: {response.text}")
+            except Exception as e:
+                print(f"Error uploading chunk {chunk_index + 1}: {str(e)}")
+                retries += 1
+                if retries < self.MAX_RETRIES:
+                    print(f"Retrying chunk {chunk_index + 1} (attempt {retries + 1})...")
+                    time.sleep(backoff_delay(retries))
+                else:
+                    print(f"Failed to upload chunk {chunk_index + 1} after {self.MAX_RETRIES} attempts")
+        return None
+
+    def _finish_chunks(
+        self,
+        upload_url: str,
+        dzuuid: str,
+        file_path: str,
+        content_type: str,
+        album_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Ask the node to assemble the uploaded chunks, with retries.
+
+        :return: The URL of the uploaded file, or None if finalization failed.
+        """
+        finish_retries = 0
+        while finish_retries < self.MAX_RETRIES:
+            try:
+                finish_data = {
+                    "files": [
+                        {
+                            "uuid": dzuuid,
+                            "original": os.path.basename(file_path),
+                            "type": content_type,
+                            "albumid": album_id,
+                            "filelength": None,
+                            "age": None,
+                        }
+                    ]
+                }
+
+                finish_response = self.session.post(
+                    f"{upload_url}/finishchunks",
+                    data=orjson.dumps(finish_data),
+                    headers={"Content-Type": "application/json"},
+                )
+
+                if finish_response.status_code == 200:
+                    finish_data = read_json(finish_response)
+                    if finish_data.get("success"):
+                        files_data = finish_data.get("files", [])
                         if files_data and len(files_data) > 0:
                             file_url = files_data[0].get("url")
                             return file_url
-                else:
-                    print(f"Error uploading file: HTTP {response.status_code}")
-                    print("Response:", response.text)
-                    return None
-        else:
-            with tqdm(
-                total=total_filesize,
-                unit="B",
-                unit_scale=True,
-                desc=f"Uploading {os.path.basename(file_path)}",
-            ) as pbar:
-                with open(file_path, "rb") as f:
-                    files = {"files[]": (os.path.basename(file_path), f, content_type)}
-                    request_headers = self.headers.copy()
-                    request_headers["albumid"] = album_id if album_id else ""
-
-                    response = requests.post(self.upload_url, files=files, headers=request_headers)
-                    pbar.update(total_filesize)
-
-                    if response.status_code == 200:
-                        response_data = response.json()
-                        if response_data.get("success"):
-                            files_data = response_data.get("files", [])
-                            if files_data and len(files_data) > 0:
-                                file_url = files_data[0].get("url")
-                                return file_url
-                    else:
-                        print(f"Error uploading file: HTTP {response.status_code}")
-                        print("Response:", response.text)
-                        return None
+            except Exception as e:
+                print(f"Error finalizing upload: {str(e)}")
+            finish_retries += 1
+            if finish_retries < self.MAX_RETRIES:
+                print(f"Retrying finalization (attempt {finish_retries + 1})...")
+                time.sleep(backoff_delay(finish_retries))
+        return None
 
     def _upload_chunk_file(
         self,
@@ -275,126 +389,105 @@ class BunkrUploader:
         album_id: Optional[str] = None,
     ) -> Optional[str]:
         dzuuid = str(uuid.uuid4())
+        # All chunks of one file must go to the same node, even if another upload refreshes the URL
+        upload_url = self.upload_url
+        file_lock = threading.Lock()
+
+        # Everything but the chunk index and offset is the same for every chunk, so build it once.
+        # A single boundary per upload is what browsers send as well.
+        filename = os.path.basename(file_path)
+        boundary = f"----geckoformboundary{uuid.uuid4().hex[:24]}"
+        upload_headers = {
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Accept-Encoding": "gzip, deflate, br, zstd",
+            "Sec-GPC": "1",
+            "Connection": "keep-alive",
+            "Sec-Fetch-Dest": "empty",
+            "Sec-Fetch-Mode": "cors",
+            "Sec-Fetch-Site": "cross-site",
+            "TE": "trailers",
+        }
+        file_part = file_part_prefix(boundary, "files[]", filename)
+        end_boundary = f"\r\n--{boundary}--\r\n".encode()
+
+        # Pre-encode the form fields; only the chunk index and offset are filled in per chunk
+        field = partial(form_field_prefix, boundary)
+        uuid_part = field("dzuuid") + dzuuid.encode() + b"\r\n"
+        index_prefix = field("dzchunkindex")
+        sizes_part = (
+            field("dztotalfilesize")
+            + b"%d\r\n" % total_filesize
+            + field("dzchunksize")
+            + b"%d\r\n" % self.chunk_size
+            + field("dztotalchunkcount")
+            + b"%d\r\n" % total_chunks
+        )
+        offset_prefix = field("dzchunkbyteoffset")
+
+        def form_head(chunk_index: int, chunk_byte_offset: int) -> bytearray:
+            head = bytearray(uuid_part)
+            head += index_prefix
+            head += b"%d\r\n" % chunk_index
+            head += sizes_part
+            head += offset_prefix
+            head += b"%d\r\n" % chunk_byte_offset
+            head += file_part
+            return head
 
         # Use tqdm only if not in silent mode
+        pbar = None
         if not self.silent:
-            chunks_iter = tqdm(range(total_chunks), desc=f"Uploading {os.path.basename(file_path)} chunks")
-        else:
-            chunks_iter = range(total_chunks)
-
-        for chunk_index in chunks_iter:
-            retries = 0
-            while retries < self.MAX_RETRIES:
-                try:
-                    chunk_byte_offset = chunk_index * self.chunk_size
-                    with open(file_path, "rb") as f:
-                        f.seek(chunk_byte_offset)
-                        chunk_data = f.read(self.chunk_size)
-
-                    boundary = f"----geckoformboundary{uuid.uuid4().hex[:24]}"
-                    upload_headers = self.headers.copy()
-                    upload_headers.update(
-                        {
-                            "Content-Type": f"multipart/form-data; boundary={boundary}",
-                            "Accept-Encoding": "gzip, deflate, br, zstd",
-                            "Sec-GPC": "1",
-                            "Connection": "keep-alive",
-                            "Sec-Fetch-Dest": "empty",
-                            "Sec-Fetch-Mode": "cors",
-                            "Sec-Fetch-Site": "cross-site",
-                            "TE": "trailers",
-                        }
-                    )
-
-                    # Construct multipart form-data manually
-                    form_data = []
-
-                    # Add form fields
-                    fields = {
-                        "dzuuid": dzuuid,
-                        "dzchunkindex": str(chunk_index),
-                        "dztotalfilesize": str(total_filesize),
-                        "dzchunksize": str(self.chunk_size),
-                        "dztotalchunkcount": str(total_chunks),
-                        "dzchunkbyteoffset": str(chunk_byte_offset),
-                    }
-
-                    for field_name, field_value in fields.items():
-                        form_data.append(f"--{boundary}")
-                        form_data.append(f'Content-Disposition: form-data; name="{field_name}"')
-                        form_data.append("")
-                        form_data.append(field_value)
-
-                    # Add file data
-                    form_data.append(f"--{boundary}")
-                    form_data.append(
-                        f'Content-Disposition: form-data; name="files[]"; filename="{os.path.basename(file_path)}"'
-                    )
-                    form_data.append("Content-Type: application/octet-stream")
-                    form_data.append("")
-
-                    # Convert form_data to bytes and combine with chunk data
-                    form_bytes = "\r\n".join(form_data).encode() + b"\r\n"
-                    end_boundary = f"\r\n--{boundary}--\r\n".encode()
-
-                    # Combine all parts into final payload
-                    payload = form_bytes + chunk_data + end_boundary
-
-                    response = requests.post(self.upload_url, data=payload, headers=upload_headers)
-
-                    if response.status_code == 200:
-                        response_data = response.json()
-                        if chunk_index == total_chunks - 1 and response_data.get("success"):
-                            # Final chunk success, try to finalize
-                            finish_retries = 0
-                            while finish_retries < self.MAX_RETRIES:
-                                try:
-                                    finish_data = {
-                                        "files": [
-                                            {
-                                                "uuid": dzuuid,
-                                                "original": os.path.basename(file_path),
-                                                "type": content_type,
-                                                "albumid": album_id,
-                                                "filelength": None,
-                                                "age": None,
-                                            }
-                                        ]
-                                    }
-
-                                    finish_response = requests.post(
-                                        f"{self.upload_url}/finishchunks",
-                                        json=finish_data,
-                                        headers=self.headers,
-                                    )
-
-                                    if finish_response.status_code == 200:
-                                        finish_data = finish_response.json()
-                                        if finish_data.get("success"):
-                                            files_data = finish_data.get("files", [])
-                                            if files_data and len(files_data) > 0:
-                                                file_url = files_data[0].get("url")
-                                                return file_url
-                                    finish_retries += 1
-                                    if finish_retries < self.MAX_RETRIES:
-                                        print(f"Retrying finalization (attempt {finish_retries + 1})...")
-                                except Exception as e:
-                                    print(f"Error finalizing upload: {str(e)}")
-                                    finish_retries += 1
-                                    if finish_retries < self.MAX_RETRIES:
-                                        print(f"Retrying finalization (attempt {finish_retries + 1})...")
-                        break  # Success, exit retry loop
-                    else:
-                        raise Exception(f"HTTP {response.status_code}: {response.text}")
-                except Exception as e:
-                    print(f"Error uploading chunk {chunk_index + 1}: {str(e)}")
-                    retries += 1
-                    if retries < self.MAX_RETRIES:
-                        print(f"Retrying chunk {chunk_index + 1} (attempt {retries + 1})...")
-                    else:
-                        print(f"Failed to upload chunk {chunk_index + 1} after {self.MAX_RETRIES} attempts")
-                        return None
-        return None
+            # Track bytes rather than chunks, redrawing at most twice a second
+            pbar = tqdm(
+                total=total_filesize,
+                unit="B",
+                unit_scale=True,
+                mininterval=0.5,
+                desc=f"Uploading {filename}",
+            )
+
+        # Open (and map) the file once for all chunks
+        with open_for_slicing(file_path) as f:
+            upload_chunk = partial(
+                self._upload_one_chunk,
+                f,
+                file_lock,
+                upload_url,
+                upload_headers,
+                form_head,
+                end_boundary,
+                total_filesize,
+            )
+            results = [None] * total_chunks
+            try:
+                if self.parallel_chunks > 1:
+                    with ThreadPoolExecutor(max_workers=self.parallel_chunks) as executor:
+                        future_to_index = {executor.submit(upload_chunk, i): i for i in range(total_chunks)}
+                        for future in as_completed(future_to_index):
+                            chunk_index = future_to_index[future]
+                            results[chunk_index] = future.result()
+                            if results[chunk_index] is None:
+                                # Give up on the remaining chunks
+                                for pending in future_to_index:
+                                    pending.cancel()
+                                return None
+                            if pbar:
+                                pbar.update(min(self.chunk_size, total_filesize - chunk_index * self.chunk_size))
+                else:
+                    for chunk_index in range(total_chunks):
+                        results[chunk_index] = upload_chunk(chunk_index)
+                        if results[chunk_index] is None:
+                            return None
+                        if pbar:
+                            pbar.update(min(self.chunk_size, total_filesize - chunk_index * self.chunk_size))
+            finally:
+                if pbar:
+                    pbar.close()
+
+        # Only finalize once every chunk is on the server and the last one was accepted
+        if not results[-1].get("success"):
+            return None
+        return self._finish_chunks(upload_url, dzuuid, file_path, content_type, album_id)
 
     def upload_file(self, file_path: str, album_id: Optional[str] = None) -> Optional[str]:
         """
@@ -416,7 +509,7 @@ class BunkrUploader:
 
         total_filesize = os.path.getsize(file_path)
         total_chunks = math.ceil(total_filesize / self.chunk_size)
-        content_type, _ = mimetypes.guess_type(file_path) or "application/octet-stream"
+        content_type = _content_type_for(os.path.splitext(file_path)[1].lower())
 
         retries = 0
         while retries < self.MAX_RETRIES:
@@ -435,6 +528,7 @@ class BunkrUploader:
                 retries += 1
                 if retries < self.MAX_RETRIES:
                     print(f"Refreshing upload URL and retrying (attempt {retries + 1})...")
+                    time.sleep(backoff_delay(retries))
                     self.refresh_url()
                 else:
                     print(f"Failed to upload file after {self.MAX_RETRIES} attempts")
@@ -457,27 +551,30 @@ class BunkrUploader:
         if batch_size < 1:
             batch_size = 1
 
-        uploaded_files = []
+        # Results are keyed by input position so the URLs come back in the order the files were given,
+        # which keeps split video parts in sequence
+        uploaded_files = {}
 
         with ThreadPoolExecutor(max_workers=batch_size) as executor:
             # Submit all upload tasks
             future_to_file = {
-                executor.submit(self.upload_file, file_path, album_id): file_path for file_path in file_paths
+                executor.submit(self.upload_file, file_path, album_id): (index, file_path)
+                for index, file_path in enumerate(file_paths)
             }
 
             # Process completed uploads as they finish
             for future in as_completed(future_to_file):
-                file_path = future_to_file[future]
+                index, file_path = future_to_file[future]
                 try:
                     result = future.result()
                     if result:
-                        uploaded_files.append(result)
+                        uploaded_files[index] = result
                     else:
                         print(f"Failed to upload: {os.path.basename(file_path)}")
                 except Exception as e:
                     print(f"Error uploading {os.path.basename(file_path)}: {str(e)}")
 
-        return uploaded_files
+        return [uploaded_files[index] for index in sorted(uploaded_files)]
 
     def upload_directory(self, directory_path: str, album_id: Optional[str] = None, batch_size: int = 3) -> List[str]:
         """
@@ -491,9 +588,7 @@ class BunkrUploader:
         Returns:
             list: List of uploaded file URLs
         """
-        file_paths = [
-            os.path.join(directory_path, f)
-            for f in os.listdir(directory_path)
-            if os.path.isfile(os.path.join(directory_path, f))
-        ]
+        # scandir entries carry the file type, so no extra stat() per file
+        with os.scandir(directory_path) as entries:
+            file_paths = [entry.path for entry in entries if entry.is_file()]
         return self.upload_files(file_paths, album_id, batch_size)
@@ -1,4 +1,16 @@
-import requests
+import os
+import time
+import uuid
+from src.upload.multipart import FileSliceBody, file_part_prefix, form_field_prefix, open_for_slicing
+from src.upload.session import create_session, read_json
+
+# Shared session so repeated API calls and uploads reuse keep-alive connections
+# and transient failures of idempotent requests are retried with backoff
+_SESSION = create_session()
+
+# Seconds a server lookup is reused for, so back-to-back uploads share one /servers request
+SERVER_CACHE_TTL = 60
+_server_cache = {}
 
 
 def response_handler(response):
@@ -21,9 +33,9 @@ def checkAccountExists(token):
         bool: True if account exists, False otherwise
     """
     try:
-        checkAccountExists_response = requests.get(
-            url="https://api.gofile.io/accounts/getid", headers={"Authorization": f"Bearer {token}"}
-        ).json()
+        checkAccountExists_response = read_json(
+            _SESSION.get(url="https://api.gofile.io/accounts/getid", headers={"Authorization": f"Bearer {token}"})
+        )
 
         if checkAccountExists_response["status"] == "ok":
             return True
@@ -43,9 +55,9 @@ def getAccountId(token):
     Returns:
         str: Account ID if successful
     """
-    getAccountId_response = requests.get(
-        url="https://api.gofile.io/accounts/getid", headers={"Authorization": f"Bearer {token}"}
-    ).json()
+    getAccountId_response = read_json(
+        _SESSION.get(url="https://api.gofile.io/accounts/getid", headers={"Authorization": f"Bearer {token}"})
+    )
 
     return response_handler(getAccountId_response)
 
@@ -64,15 +76,15 @@ def getAccountInfo(token, accountId=None):
     if not accountId:
         accountId = getAccountId(token)
 
-    getAccountInfo_response = requests.get(
-        url=f"https://api.gofile.io/accounts/{accountId}", headers={"Authorization": f"Bearer {token}"}
-    ).json()
+    getAccountInfo_response = read_json(
+        _SESSION.get(url=f"https://api.gofile.io/accounts/{accountId}", headers={"Authorization": f"Bearer {token}"})
+    )
 
     return response_handler(getAccountInfo_response)
 
 
 def checkApi():
-    checkApi_response = requests.get(url="https://api.gofile.io/").json()
+    checkApi_response = read_json(_SESSION.get(url="https://api.gofile.io/"))
 
     return response_handler(checkApi_response)
 
@@ -87,7 +99,11 @@ def getServer(zone: str = "eu"):
     Returns:
         Server information dictionary with 'name' and 'zone' keys.
     """
-    getServer_response = requests.get(url="https://api.gofile.io/servers").json()
+    cached = _server_cache.get(zone)
+    if cached and time.monotonic() - cached[0] < SERVER_CACHE_TTL:
+        return cached[1]
+
+    getServer_response = read_json(_SESSION.get(url="https://api.gofile.io/servers"))
     server_data = response_handler(getServer_response)
 
     # Try to find servers in the requested zone
@@ -99,6 +115,7 @@ def getServer(zone: str = "eu"):
 
     # If servers are available, return the first one
     if available_servers:
+        _server_cache[zone] = (time.monotonic(), available_servers[0])
         return available_servers[0]
 
     # Fallback in case of unexpected response format
@@ -114,92 +131,101 @@ def uploadFile(
     if server is None:
         server = getServer()["name"]
 
-    # Prepare the multipart form data
-    files = {"file": open(file, "rb")}
-
-    # Prepare optional parameters
-    data = {}
+    # Build the multipart form by hand so the file is streamed from disk instead of read into memory
+    boundary = uuid.uuid4().hex
+    head = bytearray()
     if folderId:
-        data["folderId"] = folderId
+        head += form_field_prefix(boundary, "folderId") + folderId.encode() + b"\r\n"
+    head += file_part_prefix(boundary, "file", os.path.basename(file))
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
     if token:
         # If token is provided, add it as Authorization header
-        headers = {"Authorization": f"Bearer {token}"}
-    else:
-        headers = {}
+        headers["Authorization"] = f"Bearer {token}"
 
-    # Make the request
-    uploadFile_response = requests.post(
-        url=f"https://{server}.gofile.io/uploadFile", files=files, data=data, headers=headers
-    ).json()
+    # Make the request, closing the file once it has been sent
+    with open_for_slicing(file) as fh:
+        body = FileSliceBody(head, fh, 0, os.path.getsize(file), tail)
+        uploadFile_response = read_json(
+            _SESSION.post(url=f"https://{server}.gofile.io/uploadFile", data=body, headers=headers)
+        )
 
     return response_handler(uploadFile_response)
 
 
 def getContent(contentId, token):
-    getContent_response = requests.get(url=f"https://api.gofile.io/getContent?contentId={contentId}&token={token}")
+    getContent_response = read_json(
+        _SESSION.get(url="https://api.gofile.io/getContent", params={"contentId": contentId, "token": token})
+    )
 
     return response_handler(getContent_response)
 
 
 def createFolder(parentFolderId, folderName, token):
-    createFolder_response = requests.put(
-        url="https://api.gofile.io/createFolder",
-        data={"parentFolderId": parentFolderId, "folderName": folderName, "token": token},
-    ).json()
+    createFolder_response = read_json(
+        _SESSION.put(
+            url="https://api.gofile.io/createFolder",
+            data={"parentFolderId": parentFolderId, "folderName": folderName, "token": token},
+        )
+    )
 
     return response_handler(createFolder_response)
 
 
 def setFolderOption(token, folderId, option, value):
-    setFolderOptions_response = requests.put(
-        url="https://api.gofile.io/setFolderOption",
-        data={"token": token, "folderId": folderId, "option": option, "value": value},
-    ).json()
+    setFolderOptions_response = read_json(
+        _SESSION.put(
+            url="https://api.gofile.io/setFolderOption",
+            data={"token": token, "folderId": folderId, "option": option, "value": value},
+        )
+    )
 
     return response_handler(setFolderOptions_response)
 
 
 def copyContent(contentsId, folderIdDest, token):
-    copyContent_reponse = requests.put(
-        url="https://api.gofile.io/copyContent",
-        data={"contentsId": contentsId, "folderIdDest": folderIdDest, "token": token},
-    ).json()
+    copyContent_reponse = read_json(
+        _SESSION.put(
+            url="https://api.gofile.io/copyContent",
+            data={"contentsId": contentsId, "folderIdDest": folderIdDest, "token": token},
+        )
+    )
 
     return response_handler(copyContent_reponse)
 
 
 def deleteFolder(folderId, token):  # deprecated
     print("Deprecated, use deleteContent() instead")
-    deleteFolder_response = requests.delete(
-        url="https://api.gofile.io/deleteContent", data={"folderId": folderId, "token": token}
-    ).json()
+    deleteFolder_response = read_json(
+        _SESSION.delete(url="https://api.gofile.io/deleteContent", data={"folderId": folderId, "token": token})
+    )
 
     return response_handler(deleteFolder_response)
 
 
 def deleteFile(fileId, token):  # deprecated
     print("Deprecated, use deleteContent() instead")
-    deleteFile_response = requests.delete(
-        url="https://api.gofile.io/deleteContent", data={"fileId": fileId, "token": token}
-    ).json()
+    deleteFile_response = read_json(
+        _SESSION.delete(url="https://api.gofile.io/deleteContent", data={"fileId": fileId, "token": token})
+    )
 
     return response_handler(deleteFile_response)
 
 
 def deleteContent(contentId, token):
-    deleteContent_response = requests.delete(
-        url="https://api.gofile.io/deleteContent", data={"contentId": contentId, "token": token}
-    ).json()
+    deleteContent_response = read_json(
+        _SESSION.delete(url="https://api.gofile.io/deleteContent", data={"contentId": contentId, "token": token})
+    )
 
     return response_handler(deleteContent_response)
 
 
 def getAccountDetails(token: str, allDetails: bool = False):
+    # Pass the token as a query parameter rather than formatting it into the URL
+    params = {"token": token}
     if allDetails:
-        getAccountDetails_response = requests.get(
-            url=f"https://api.gofile.io/getAccountDetails?token={token}&allDetails=true"
-        ).json()
-    else:
-        getAccountDetails_response = requests.get(url=f"https://api.gofile.io/getAccountDetails?token={token}").json()
+        params["allDetails"] = "true"
+    getAccountDetails_response = read_json(_SESSION.get(url="https://api.gofile.io/getAccountDetails", params=params))
 
     return response_handler(getAccountDetails_response)
@@ -1,64 +1,155 @@
-import requests
+import re
 import os
 import uuid
 import time
 import argparse
 import json
-from bs4 import BeautifulSoup
+import threading
+from http.cookiejar import LWPCookieJar
+from requests.cookies import create_cookie
+from src.upload.multipart import FileSliceBody, file_part_prefix, form_field_prefix, open_for_slicing
+from src.upload.session import create_session
 
 COOKIES_FILE = "jpg5_cookies.json"
-
-
-def get_token():
+# The session's cookies as of the last request, seeded from the COOKIES_FILE export
+COOKIE_JAR_FILE = "jpg5_cookies.lwp"
+COOKIE_DOMAIN = "jpg5.su"
+
+# Shared session so the token lookup and the upload that follows it reuse one keep-alive connection
+_SESSION = create_session()
+_cookie_lock = threading.Lock()
+# (absolute path, mtime) of the JSON export the session's cookies were loaded for
+_cookies_source = None
+
+# Seconds a fetched auth token is reused for; a rejected upload fetches a new one sooner
+TOKEN_CACHE_TTL = 15 * 60
+_token_cache = None
+
+# Define boundary for multipart form
+BOUNDARY = "----geckoformboundary1424e527941717af31b4c0c14514a0fc"
+
+# Upload request headers - all headers from the working request
+UPLOAD_HEADERS = {
+    "Host": "jpg5.su",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:137.0) Gecko/20100101 Firefox/137.0",
+    "Accept": "application/json",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate, br, zstd",
+    "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+    "Origin": "https://jpg5.su",
+    "Connection": "keep-alive",
+    "Referer": "https://jpg5.su/upload",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-origin",
+    "TE": "trailers",
+}
+
+# Multipart framing that is the same for every upload, encoded once
+_FIELD_PREFIXES = {
+    name: b"\r\n" + form_field_prefix(BOUNDARY, name) for name in ("type", "action", "timestamp", "auth_token", "nsfw")
+}
+_CLOSING_BOUNDARY = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+# Matches the `PF.obj.config.auth_token = "...";` assignment in the upload page's inline script
+TOKEN_RE = re.compile(rb"""PF\.obj\.config\.auth_token\s*=\s*["']([^"']+)["']""")
+
+
+def get_token(refresh=False):
     """
     Get the authentication token and updated cookies from jpg5.su
 
+    Args:
+        refresh: Fetch a new token even if the cached one hasn't expired
+
     Returns:
         str: token
     """
-    cookies = load_cookies(COOKIES_FILE)
-    response = requests.get("https://jpg5.su/", cookies=cookies)
-    soup = BeautifulSoup(response.text, "html.parser")
-    scripts = soup.find_all("script")
-
-    token = None
-    for script in scripts:
-        if script.string and "PF.obj.config.auth_token" in script.string:
-            # Extract the token using string manipulation
-            token_line = [line.strip() for line in script.string.splitlines() if "PF.obj.config.auth_token" in line][0]
-            token = token_line.split("=")[1].strip().strip('";')
-            break
-
-    # Update cookies with any set-cookies from the response
-    updated_cookies = cookies.copy()
-    if response.cookies:
-        for name, value in response.cookies.items():
-            updated_cookies[name] = value
+    global _token_cache
+    if not refresh and _token_cache and time.monotonic() - _token_cache[0] < TOKEN_CACHE_TTL:
+        return _token_cache[1]
+
+    load_session_cookies()
+    response = _SESSION.get("https://jpg5.su/")
+    # Only the token is needed, so search the raw page instead of parsing the HTML
+    match = TOKEN_RE.search(response.content)
+    token = match.group(1).decode() if match else None
 
-    save_cookies(updated_cookies, COOKIES_FILE)
+    # The session jar already merged any cookies the page set; only rewrite the file when there were some
+    if response.cookies:
+        save_session_cookies()
+    if token:
+        _token_cache = (time.monotonic(), token)
     return token
 
 
 def verify():
-    cookies = load_cookies(COOKIES_FILE)
-    if not cookies:
+    if not len(load_session_cookies()):
         raise ValueError(f"No cookies found in {COOKIES_FILE}")
     auth_token = get_token()
     if not auth_token:
         raise ValueError("Authentication token not found")
 
 
-def save_cookies(cookies, cookies_file):
+def _jar_is_current(cookies_file) -> bool:
+    """Whether the saved cookie jar exists and is at least as new as the JSON export"""
+    try:
+        return os.path.getmtime(COOKIE_JAR_FILE) >= os.path.getmtime(cookies_file)
+    except FileNotFoundError:
+        return os.path.exists(COOKIE_JAR_FILE)
+
+
+def _export_key(cookies_file):
+    """Identify a cookies export by its absolute path and modification time (None if it doesn't exist)"""
+    path = os.path.abspath(cookies_file)
+    try:
+        return path, os.path.getmtime(path)
+    except FileNotFoundError:
+        return path, None
+
+
+def load_session_cookies(cookies_file=None) -> LWPCookieJar:
     """
-    Save cookies to a JSON file
+    Attach the persisted cookie jar to the shared session, loading it again whenever the export changes.
+    The JSON export is imported instead when there is no saved jar yet, the export was updated since,
+    or a different export than last time is given.
 
     Args:
-        cookies: Dictionary of cookie name-value pairs
-        cookies_file: Path to the cookies JSON file
+        cookies_file: Path to the cookies JSON file; defaults to the one last loaded, or COOKIES_FILE
+
+    Returns:
+        The session's cookie jar
     """
-    cookie_list = [{"name": name, "value": value} for name, value in cookies.items()]
-    with open(cookies_file, "w") as f:
-        json.dump(cookie_list, f)
+    global _cookies_source, _token_cache
+    with _cookie_lock:
+        if cookies_file is None:
+            cookies_file = _cookies_source[0] if _cookies_source else COOKIES_FILE
+        source = _export_key(cookies_file)
+        if source == _cookies_source:
+            return _SESSION.cookies
+
+        switched = _cookies_source is not None and _cookies_source[0] != source[0]
+        jar = LWPCookieJar(COOKIE_JAR_FILE)
+        if not switched and _jar_is_current(cookies_file):
+            try:
+                jar.load(ignore_discard=True)
+            except OSError:
+                pass
+        else:
+            for name, value in load_cookies(cookies_file).items():
+                jar.set_cookie(create_cookie(name, value, domain=COOKIE_DOMAIN))
+
+        _SESSION.cookies = jar
+        _cookies_source = source
+        # A token fetched with the previous cookies may belong to another account
+        _token_cache = None
+        return jar
+
+
+def save_session_cookies():
+    """Write the session's cookies to COOKIE_JAR_FILE, including the ones without an expiry"""
+    with _cookie_lock:
+        _SESSION.cookies.save(ignore_discard=True)
 
 
 def load_cookies(cookies_file):
@@ -100,6 +191,7 @@ def upload_file(
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
 
+    load_session_cookies(cookies_file)
     auth_token = get_token()
     if not auth_token:
         raise ValueError("Authentication token not found")
@@ -114,54 +206,14 @@ def upload_file(
     # Get current timestamp
     timestamp = int(time.time() * 1000)
 
-    # Define boundary for multipart form
-    boundary = "----geckoformboundary1424e527941717af31b4c0c14514a0fc"
-
-    # Prepare the headers - adding all headers from the working request
-    headers = {
-        "Host": "jpg5.su",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:137.0) Gecko/20100101 Firefox/137.0",
-        "Accept": "application/json",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate, br, zstd",
-        "Content-Type": f"multipart/form-data; boundary={boundary}",
-        "Origin": "https://jpg5.su",
-        "Connection": "keep-alive",
-        "Referer": "https://jpg5.su/upload",
-        "Sec-Fetch-Dest": "empty",
-        "Sec-Fetch-Mode": "cors",
-        "Sec-Fetch-Site": "same-origin",
-        "TE": "trailers",
-    }
-
-    # Load cookies from file
-    cookies = load_cookies(cookies_file)
     # Update the timestamp cookie with current time
-    cookies["__ddg10_"] = str(int(time.time()))
-
-    # Create multipart form data manually
-    with open(file_path, "rb") as f:
-        file_content = f.read()
+    _SESSION.cookies.set_cookie(create_cookie("__ddg10_", str(int(time.time())), domain=COOKIE_DOMAIN))
 
     content_type = get_content_type(ext)
 
-    # Build the multipart body with correct line endings
-    # We'll use \r\n explicitly between all parts
-    body_parts = []
-
-    # Add file part
-    body_parts.append(f"--{boundary}\r\n")
-    body_parts.append(f'Content-Disposition: form-data; name="source"; filename="{uuid_filename}"\r\n')
-    body_parts.append(f"Content-Type: {content_type}\r\n")
-    body_parts.append("\r\n")
-
-    # Convert text parts to bytes
-    body_bytes = "".join(body_parts).encode("utf-8")
-
-    # Add binary file content
-    body_bytes += file_content
+    # Build only the multipart framing in memory; the file itself is streamed between it
+    head = file_part_prefix(BOUNDARY, "source", uuid_filename, content_type)
 
-    # Add form fields with proper line breaks
     form_fields = {
         "type": "file",
         "action": "upload",
@@ -170,17 +222,25 @@ def upload_file(
         "nsfw": "1" if nsfw else "0",
     }
 
-    for key, value in form_fields.items():
-        field_part = f"\r\n--{boundary}\r\n"
-        field_part += f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
-        field_part += f"{value}"
-        body_bytes += field_part.encode("utf-8")
-
-    # Add closing boundary
-    body_bytes += f"\r\n--{boundary}--\r\n".encode("utf-8")
-
-    # Make the request with cookies
-    response = requests.post("https://jpg5.su/json", data=body_bytes, headers=headers, cookies=cookies)
+    # Make the request; the session sends the stored cookies
+    with open_for_slicing(file_path) as f:
+        for attempt in range(2):
+            tail = bytearray()
+            for key, value in form_fields.items():
+                tail += _FIELD_PREFIXES[key] + value.encode()
+            tail += _CLOSING_BOUNDARY
+
+            body = FileSliceBody(head, f, 0, os.path.getsize(file_path), bytes(tail))
+            response = _SESSION.post("https://jpg5.su/json", data=body, headers=UPLOAD_HEADERS)
+            if response.status_code not in (401, 403) or attempt:
+                break
+
+            # The cached token was rejected, so fetch a fresh one and try once more
+            form_fields["auth_token"] = get_token(refresh=True)
+            if not form_fields["auth_token"]:
+                raise ValueError("Authentication token not found")
+    if response.cookies:
+        save_session_cookies()
 
     try:
         return response.json()
@@ -0,0 +1,94 @@
+import io
+import mmap
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
+
+
+def form_field_prefix(boundary: str, name: str) -> bytes:
+    """Encode the multipart header lines that precede a form field's value."""
+    return f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode()
+
+
+def file_part_prefix(
+    boundary: str,
+    name: str,
+    filename: str,
+    content_type: str = "application/octet-stream",
+) -> bytes:
+    """Encode the multipart header lines that precede a file's contents."""
+    filename = filename.replace('"', "%22")
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n"
+        "\r\n"
+    ).encode()
+
+
+@contextmanager
+def open_for_slicing(path: str) -> Iterator[Union[mmap.mmap, io.FileIO]]:
+    """
+    Open a file for FileSliceBody, memory-mapped where the platform allows it.
+    Slices of a mapping are copied straight from the page cache, without seek/read calls or a shared lock.
+    Empty files and filesystems that can't be mapped fall back to an unbuffered file object.
+    """
+    with open(path, "rb", buffering=0) as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            mapped = None
+        if mapped is None:
+            yield f
+        else:
+            with mapped:
+                yield mapped
+
+
+class FileSliceBody:
+    """
+    Multipart request body that streams a slice of an open file between a pre-encoded
+    header and trailer, so the file is never held in memory as a whole.
+    Its length is known up front, so requests sends a Content-Length instead of chunked encoding.
+    Reads seek to their own position under the lock, so several bodies can share one file handle;
+    a memory map is sliced directly instead.
+    """
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        head: Union[bytes, bytearray],
+        file,
+        offset: int,
+        length: int,
+        tail: bytes,
+        lock: Optional[threading.Lock] = None,
+    ) -> None:
+        self.head = head
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.tail = tail
+        self.lock = lock or threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.head) + self.length + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        position, remaining = self.offset, self.length
+        while remaining:
+            size = min(self.READ_SIZE, remaining)
+            if isinstance(self.file, mmap.mmap):
+                data = self.file[position : position + size]
+            else:
+                with self.lock:
+                    self.file.seek(position)
+                    data = self.file.read(size)
+            if not data:
+                break
+            yield data
+            position += len(data)
+            remaining -= len(data)
+        yield self.tail
@@ -0,0 +1,40 @@
+import random
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def create_session(retries: int = 3) -> requests.Session:
+    """
+    Create a requests session that pools keep-alive connections and retries failed requests.
+
+    Connection errors and 429/500/502/503/504 responses are retried with exponential backoff and jitter,
+    honouring Retry-After, so a struggling server gets time to recover between attempts.
+    Only idempotent methods are resent on an error response; POSTs (uploads, finalize calls) may not be
+    safe to repeat, so callers retry those themselves where they are.
+    Once retries are exhausted the last response is returned rather than raised.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        backoff_jitter=0.25,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["HEAD", "GET", "PUT", "DELETE"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def read_json(response: requests.Response):
+    """Parse a JSON response body with orjson instead of the stdlib json module."""
+    return orjson.loads(response.content)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with jitter for application-level retries (attempt counts from 0)."""
+    return min(cap, base * 2**attempt) * random.uniform(0.75, 1.25)
@@ -1,16 +1,41 @@
+import asyncio
 import os
+from typing import Optional
 from src.upload.bunkr import BunkrUploader
 from src.upload.jpg5 import upload_file as jpg5_upload_file, verify as jpg5_verify
 from src.upload.gofile import (
     uploadFile as gofile_upload_file,
     checkApi as gofile_check_api,
 )
-from src.video import split_video_by_size
+from src.video import split_video_by_size, probe
 from src.config import CONFIG
 
 
 verified_uploaders = []
 
+# One uploader per process, so its session and startup lookups are shared by every bunkr upload
+_bunkr_uploader: Optional[BunkrUploader] = None
+_bunkr_uploader_lock = asyncio.Lock()
+
+
+async def _get_bunkr_uploader() -> BunkrUploader:
+    """Return the shared bunkr uploader, creating it on first use"""
+    global _bunkr_uploader
+    async with _bunkr_uploader_lock:
+        if _bunkr_uploader is None:
+            _bunkr_uploader = await asyncio.to_thread(
+                BunkrUploader, os.environ.get("BUNKR_TOKEN"), config={"silent": True}
+            )
+        return _bunkr_uploader
+
+
+def close_uploaders():
+    """Close the shared bunkr uploader's session"""
+    global _bunkr_uploader
+    if _bunkr_uploader is not None:
+        _bunkr_uploader.session.close()
+    _bunkr_uploader = None
+
 
 async def upload_file(path: str, service: str) -> dict:
     """
@@ -25,11 +50,12 @@ async def upload_file(path: str, service: str) -> dict:
     """
     result = {"success": False, "url": None, "multiple": False, "urls": []}
 
+    # The uploaders are blocking, so they run in worker threads to keep the event loop responsive
     try:
         if service == "jpg5":
             if "jpg5" not in verified_uploaders:
                 return result
-            url = jpg5_upload_file(path)
+            url = await asyncio.to_thread(jpg5_upload_file, path)
             if url.get("status_code", 200) == 500:
                 return result
             if url:
@@ -39,7 +65,7 @@ async def upload_file(path: str, service: str) -> dict:
         elif service == "gofile":
             if "gofile" not in verified_uploaders:
                 return result
-            upload_result = gofile_upload_file(path)
+            upload_result = await asyncio.to_thread(gofile_upload_file, path)
             if upload_result and "downloadPage" in upload_result:
                 result["success"] = True
                 result["url"] = upload_result["downloadPage"]
@@ -51,15 +77,19 @@ async def upload_file(path: str, service: str) -> dict:
                 return result
             # Split the video into chunks if it's too large
             file_size = os.path.getsize(path)
-            uploader = BunkrUploader(os.environ.get("BUNKR_TOKEN"), config={"silent": True})
+            uploader = await _get_bunkr_uploader()
 
             if file_size > uploader.max_file_size:
                 max_size_gb = uploader.max_file_size / (1024 * 1024 * 1024)
-                split_paths = split_video_by_size(path, max_size_gb * 0.9)
+                # Only a file that needs splitting is probed; the result spares the splitter its own stat and probe
+                info = await asyncio.to_thread(probe, path)
+                split_paths = await asyncio.to_thread(split_video_by_size, path, max_size_gb * 0.9, info)
 
                 if isinstance(split_paths, list):
-                    # Use non-async method (run synchronously)
-                    urls = uploader.upload_files(split_paths, None, 1)
+                    # The parts are independent uploads, so several can share the upstream bandwidth
+                    urls = await asyncio.to_thread(
+                        uploader.upload_files, split_paths, None, CONFIG.bunkr_parallel_uploads
+                    )
 
                     if urls:
                         result["success"] = True
@@ -67,14 +97,15 @@ async def upload_file(path: str, service: str) -> dict:
                         result["urls"] = urls
 
                     if CONFIG.delete_split_video_after_upload:
-                        try:
-                            for p in split_paths:
-                                os.remove(p)
-                        except Exception as e:
-                            print(f"Error removing split video files {split_paths}: {str(e)}")
+                        # Remove the parts concurrently; one failure doesn't stop the others from being removed
+                        removals = await asyncio.gather(
+                            *(asyncio.to_thread(os.remove, p) for p in split_paths), return_exceptions=True
+                        )
+                        for p, error in zip(split_paths, removals):
+                            if isinstance(error, Exception):
+                                print(f"Error removing split video file {p}: {str(error)}")
             else:
-                # Use non-async method (run synchronously)
-                url = uploader.upload_file(path)
+                url = await asyncio.to_thread(uploader.upload_file, path)
 
                 if url:
                     result["success"] = True
@@ -89,26 +120,26 @@ async def upload_file(path: str, service: str) -> dict:
     return result
 
 
-async def verify_uploaders():
-    """
-    Verify the uploaders by checking if they can upload a test file.
-    """
+async def _verify_uploader(service: str, check) -> None:
+    """Await an uploader check and record the service if it passes."""
     try:
-        BunkrUploader(os.environ.get("BUNKR_TOKEN"), config={"silent": True})
-        verified_uploaders.append("bunkr")
+        await check()
+        verified_uploaders.append(service)
     except Exception as e:
-        print(f"Error verifying bunkr uploader: {e}")
+        print(f"Error verifying {service} uploader: {e}")
 
-    try:
-        jpg5_verify()
-        verified_uploaders.append("jpg5")
-    except Exception as e:
-        print(f"Error verifying jpg5 uploader: {e}")
 
-    try:
-        gofile_check_api()
-        verified_uploaders.append("gofile")
-    except Exception as e:
-        print(f"Error verifying gofile uploader: {e}")
+async def verify_uploaders():
+    """
+    Verify the uploaders by checking if they can upload a test file.
+    """
+    # Each check is a network round trip, so they run concurrently; the bunkr check
+    # creates the uploader that every later bunkr upload reuses
+    await asyncio.gather(
+        _verify_uploader("bunkr", _get_bunkr_uploader),
+        # The blocking checks run in worker threads to keep the event loop responsive
+        _verify_uploader("jpg5", lambda: asyncio.to_thread(jpg5_verify)),
+        _verify_uploader("gofile", lambda: asyncio.to_thread(gofile_check_api)),
+    )
 
     return verified_uploaders
@@ -1,9 +1,12 @@
-from src.video.video import split_video_by_size
+from src.video.video import split_video_by_size, h264_encoder_args, probe, MediaInfo
 from src.video.thumbnail import auto_create_thumbnail
 from src.video.cleanup import check_disk_space_and_cleanup
 
 __all__ = [
     "split_video_by_size",
+    "h264_encoder_args",
+    "probe",
+    "MediaInfo",
     "auto_create_thumbnail",
     "check_disk_space_and_cleanup",
 ]
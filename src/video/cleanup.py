@@ -1,9 +1,10 @@
 import os
 import shutil
-from pathlib import Path
 from src.discord_bot import discord_bot
 from src.config import CONFIG
 
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov")
+
 
 async def check_disk_space_and_cleanup(output_dir, min_free_gb=20.0):
     """
@@ -17,69 +18,49 @@ async def check_disk_space_and_cleanup(output_dir, min_free_gb=20.0):
         if not os.path.exists(output_dir):
             return  # Nothing to clean if directory doesn't exist
 
-        # Get the drive/partition where the recordings are stored
-        if os.name == "nt":  # Windows
-            drive = os.path.splitdrive(output_dir)[0] + "\\"
-        else:  # Linux/MacOS
-            drive = output_dir
-            while not os.path.ismount(drive):
-                parent = os.path.dirname(drive)
-                if parent == drive:  # Reached root
-                    drive = "/"
-                    break
-                drive = parent
-
-        # Get disk usage statistics
-        disk_usage = shutil.disk_usage(drive)
+        # disk_usage reports on the filesystem holding any path, so no mount point lookup is needed
+        disk_usage = shutil.disk_usage(output_dir)
         free_gb = disk_usage.free / (1024 * 1024 * 1024)
 
         # If free space is below threshold, start cleaning up
         if free_gb < min_free_gb:
-            # Get all video files in the output directory
+            # Get all video files in the output directory, stat'ing each one once
             video_files = []
-            for ext in [".mp4", ".mkv", ".avi", ".mov"]:
-                video_files.extend(list(Path(output_dir).glob(f"*{ext}")))
+            with os.scandir(output_dir) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(VIDEO_EXTENSIONS) and entry.is_file():
+                        stat = entry.stat()
+                        video_files.append((stat.st_ctime, stat.st_size, entry.path, os.path.splitext(entry.name)[0]))
 
             if not video_files:
                 print(f"No videos found in {output_dir} to clean up")
                 return
 
             # Sort by creation time, oldest first
-            video_files.sort(key=lambda x: os.path.getctime(x))
+            video_files.sort()
 
-            # Calculate how many files we need to remove
-            target_free_gb = min_free_gb
-            to_free_gb = target_free_gb - free_gb
+            # Calculate how many bytes we need to free, so the loop only compares integers
+            to_free_bytes = int(min_free_gb * (1 << 30)) - disk_usage.free
 
             bytes_freed = 0
             files_removed = 0
             protected_files_skipped = 0
+            # Lowercased once, since every file is matched against every protected user
+            protected_users = tuple(user.lower() for user in CONFIG.protected_users)
 
             # Remove oldest files until we free up enough space or run out of files
-            for file_path in video_files:
-                # Check if file belongs to a protected user
-                file_name = file_path.stem
-                is_protected = False
-
+            for _, file_size, file_path, file_name in video_files:
                 # Check if any protected username is in the file name
-                for protected_user in CONFIG.protected_users:
-                    if protected_user.lower() in file_name.lower():
-                        is_protected = True
-                        protected_files_skipped += 1
-                        print(f"Skipping protected user file: {file_path}")
-                        break
-
-                if is_protected:
+                file_name = file_name.lower()
+                if any(protected_user in file_name for protected_user in protected_users):
+                    protected_files_skipped += 1
+                    print(f"Skipping protected user file: {file_path}")
                     continue
 
-                # Check file size and add to deletion list
-                file_size = os.path.getsize(file_path)
-                file_size_gb = file_size / (1024 * 1024 * 1024)
-
                 # Remove the file and its thumbnail if exists
                 try:
                     # Try to find and remove any associated thumbnail
-                    thumbnail_path = str(file_path).rsplit(".", 1)[0] + ".jpg"
+                    thumbnail_path = file_path.rsplit(".", 1)[0] + ".jpg"
                     if os.path.exists(thumbnail_path):
                         os.remove(thumbnail_path)
                         print(f"Removed thumbnail: {thumbnail_path}")
@@ -88,10 +69,10 @@ async def check_disk_space_and_cleanup(output_dir, min_free_gb=20.0):
                     os.remove(file_path)
                     bytes_freed += file_size
                     files_removed += 1
-                    print(f"Removed video: {file_path} ({file_size_gb:.2f}GB)")
+                    print(f"Removed video: {file_path} ({file_size / (1 << 30):.2f}GB)")
 
                     # Check if we've freed enough space
-                    if bytes_freed / (1024 * 1024 * 1024) >= to_free_gb:
+                    if bytes_freed >= to_free_bytes:
                         break
 
                 except Exception as e:
@@ -1,12 +1,16 @@
+import os
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+# Frames closer than this to the current position are grabbed through instead of seeked to
+MAX_GRAB_DISTANCE = 120
 
-def get_frame_timestamp(cap, frame_idx):
+
+def get_frame_timestamp(fps, frame_idx):
     """Get timestamp for a specific frame in HH:MM:SS format."""
-    fps = cap.get(cv2.CAP_PROP_FPS)
     seconds = frame_idx / fps
     hours = int(seconds // 3600)
     minutes = int((seconds % 3600) // 60)
@@ -14,99 +18,83 @@ def get_frame_timestamp(cap, frame_idx):
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
 
+@lru_cache(maxsize=4)
+def get_font(name: str, size: int):
+    """Load a TrueType font once per process, falling back to the default font if it isn't available."""
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
 def process_frame(frame, target_size, timestamp):
     """Process a single frame in parallel"""
     try:
+        # Shrink first, keeping the aspect ratio, so the colour conversion and PIL copy only see the small image
+        height, width = frame.shape[:2]
+        scale = min(target_size[0] / width, target_size[1] / height)
+        if scale < 1:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
         frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(frame)
-        pil_image.thumbnail(target_size, Image.Resampling.LANCZOS)
-        return (pil_image, timestamp)
+        return (Image.fromarray(frame), timestamp)
     except Exception as e:
         print(f"Error processing frame: {e}")
         return None
 
 
-def seek_frame(cap, target_frame_idx, max_attempts=3):
-    """Frame seeking with fallback strategies."""
-    for attempt in range(max_attempts):
-        # Try different seeking strategies
-        if attempt == 0:
-            # Try exact frame positioning
-            cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame_idx)
-        elif attempt == 1:
-            # Try seeking by ratio
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            pos = target_frame_idx / total_frames
-            cap.set(cv2.CAP_PROP_POS_AVI_RATIO, pos)
-        else:
-            # Try seeking to nearest keyframe
-            cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, target_frame_idx - 30))
-            for _ in range(min(30, target_frame_idx)):
-                cap.read()
-
-        # Read and validate frame
-        ret, frame = cap.read()
-        if ret and frame is not None and frame.size > 0:
-            return True, frame
-
-        # Reset position if attempt failed
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-
-    return False, None
-
-
-def extract_frames(video_path: str, num_frames=6, target_size=(640, 360)):
-    """Extract evenly spaced frames from a video with improved reliability."""
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print(f"Error: Could not open video: {video_path}")
-        return []
+def read_frame_at(cap, target_frame_idx, position=None):
+    """
+    Read the frame at target_frame_idx, given the capture's current position (None if unknown).
+    Nearby frames are reached by grabbing forward, which skips the conversion of the frames in between;
+    anything further away is one seek, since a seek decodes forward from the previous keyframe anyway.
+    Returns the frame (or None) and the new position.
+    """
+    if position is None or not 0 <= target_frame_idx - position <= MAX_GRAB_DISTANCE:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame_idx)
+        position = target_frame_idx
 
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    while position < target_frame_idx:
+        if not cap.grab():
+            return None, None
+        position += 1
+
+    ret, frame = cap.read()
+    if ret and frame is not None and frame.size > 0:
+        return frame, position + 1
+    return None, None
+
+
+def extract_frames(cap, total_frames: int, fps: float, num_frames=6, target_size=(640, 360)):
+    """Extract evenly spaced frames from an open video capture with improved reliability."""
     # Adjust frame indices to avoid very start and end of video
     safe_margin = int(total_frames * 0.02)  # 2% margin
+    # Ascending, so the capture only ever moves forward
     frame_indices = np.linspace(safe_margin, total_frames - safe_margin - 1, num_frames, dtype=int)
 
     frames_with_timestamps = []
-    frames_cache = {}
-    batch_size = 2
-
-    with ProcessPoolExecutor() as executor:
-        for i in range(0, len(frame_indices), batch_size):
-            batch_indices = frame_indices[i : i + batch_size]
-            frames = []
-            timestamps = []
-
-            # Read batch of frames using reliable seeking
-            for idx in batch_indices:
-                if idx in frames_cache:
-                    frames.append(frames_cache[idx])
-                    timestamps.append(get_frame_timestamp(cap, idx))
-                    continue
-
-                success, frame = seek_frame(cap, idx)
-                if success:
-                    frames_cache[idx] = frame
-                    frames.append(frame)
-                    timestamps.append(get_frame_timestamp(cap, idx))
-                else:
-                    print(f"Warning: Could not read frame at index {idx}, trying next frame")
-                    continue
-
-            # Process batch in parallel
-            if frames:  # Only process if we have valid frames
-                futures = []
-                for frame, timestamp in zip(frames, timestamps):
-                    future = executor.submit(process_frame, frame, target_size, timestamp)
-                    futures.append(future)
-
-                # Collect results
-                for future in futures:
-                    result = future.result()
-                    if result:
-                        frames_with_timestamps.append(result)
-
-    cap.release()
+    futures = []
+    position = None
+
+    # OpenCV and PIL release the GIL while converting and resizing, so threads run frames in parallel
+    # without pickling each decoded frame over to a worker process
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for idx in frame_indices:
+            idx = int(idx)
+            frame, position = read_frame_at(cap, idx, position)
+            if frame is None:
+                print(f"Warning: Could not read frame at index {idx}, trying next frame")
+                continue
+
+            # Each frame is processed while the next one is being decoded
+            timestamp = get_frame_timestamp(fps, idx)
+            futures.append(executor.submit(process_frame, frame, target_size, timestamp))
+
+        # Collect results
+        for future in futures:
+            result = future.result()
+            if result:
+                frames_with_timestamps.append(result)
 
     if not frames_with_timestamps:
         print("Warning: Could not extract any valid frames from the video")
@@ -123,21 +111,24 @@ def create_thumbnail(frames_with_timestamps: list, cols=3, save_path="thumbnail.
     rows = (len(frames_with_timestamps) + cols - 1) // cols
     frame_width, frame_height = frames_with_timestamps[0][0].size
 
-    thumbnail = Image.new("RGB", (cols * frame_width, rows * frame_height))
+    # Copy every frame into one array, then wrap it as an image once; cells left over stay black
+    grid = np.zeros((rows * frame_height, cols * frame_width, 3), dtype=np.uint8)
+    for idx, (frame, _) in enumerate(frames_with_timestamps):
+        row, col = divmod(idx, cols)
+        y_offset = row * frame_height
+        x_offset = col * frame_width
+        grid[y_offset : y_offset + frame_height, x_offset : x_offset + frame_width] = np.asarray(frame)
+
+    thumbnail = Image.fromarray(grid)
     draw = ImageDraw.Draw(thumbnail)
 
     # Try to use Arial, fallback to default if not available
-    try:
-        font = ImageFont.truetype("arial.ttf", 20)
-    except:
-        font = ImageFont.load_default()
+    font = get_font("arial.ttf", 20)
 
-    for idx, (frame, timestamp) in enumerate(frames_with_timestamps):
-        row = idx // cols
-        col = idx % cols
+    for idx, (_, timestamp) in enumerate(frames_with_timestamps):
+        row, col = divmod(idx, cols)
         x_offset = col * frame_width
         y_offset = row * frame_height
-        thumbnail.paste(frame, (x_offset, y_offset))
 
         # Add timestamp
         text_width = draw.textlength(timestamp, font=font)
@@ -162,7 +153,6 @@ def auto_create_thumbnail(video_path, save_path="thumbnail.jpg"):
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     duration_minutes = (total_frames / fps) / 60
-    cap.release()
 
     # Determine optimal number of frames and columns
     if duration_minutes < 10:
@@ -176,6 +166,9 @@ def auto_create_thumbnail(video_path, save_path="thumbnail.jpg"):
     else:
         num_frames, cols = 16, 4
 
-    # Extract and create thumbnail
-    frames_with_timestamps = extract_frames(video_path, num_frames)
+    # Extract and create thumbnail, reusing the capture so the container is only parsed once
+    try:
+        frames_with_timestamps = extract_frames(cap, total_frames, fps, num_frames)
+    finally:
+        cap.release()
     create_thumbnail(frames_with_timestamps, cols=cols, save_path=save_path)
@@ -1,49 +1,211 @@
 import os
 import subprocess
-import math
-import json
 import re
+import struct
 import traceback
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
+
+
+# H.264 encoders in order of preference, with settings close to libx264 at CRF 26
+H264_ENCODERS = {
+    "h264_nvenc": ["-preset", "p4", "-rc", "vbr", "-cq", "26", "-b:v", "0"],
+    "h264_qsv": ["-preset", "veryfast", "-global_quality", "26"],
+    "h264_videotoolbox": ["-q:v", "60"],
+    "h264_amf": ["-quality", "speed", "-rc", "cqp", "-qp_i", "26", "-qp_p", "26"],
+    "libx264": ["-preset", "veryfast", "-crf", "26"],
+}
+
+# ffprobe arguments that print just the container duration in seconds
+FFPROBE_DURATION_CMD = (
+    "ffprobe",
+    "-v",
+    "error",
+    "-show_entries",
+    "format=duration",
+    "-of",
+    "default=noprint_wrappers=1:nokey=1",
+)
+# Duration line in ffmpeg's banner output, for when ffprobe reports none
+_DURATION_RE = re.compile(r"Duration: (\d+:\d+:\d+\.\d+)")
+
+
+def _encoder_works(encoder: str) -> bool:
+    """
+    Check that an encoder can actually run by encoding a single blank frame.
+    Builds often include hardware encoders for devices the machine doesn't have.
+    """
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        "color=size=256x256:duration=0.1",
+        "-frames:v",
+        "1",
+        "-c:v",
+        encoder,
+        "-f",
+        "null",
+        "-",
+    ]
+    try:
+        # Only the exit code matters, so nothing is piped back
+        result = subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=15
+        )
+        return result.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+@lru_cache(maxsize=None)
+def get_h264_encoder(preferred: str = "auto") -> str:
+    """
+    Pick the H.264 encoder for compressed recordings, probing ffmpeg once per process.
+
+    Args:
+        preferred (str): An ffmpeg encoder name, or "auto" to use the first working
+            hardware encoder and fall back to libx264
+    """
+    if preferred == "libx264":
+        return preferred
+    if preferred != "auto":
+        # Recordings run ffmpeg with -loglevel quiet, so a bad name must be caught here
+        if _encoder_works(preferred):
+            return preferred
+        print(f"Video encoder {preferred!r} is not usable, falling back to libx264")
+        return "libx264"
+
+    try:
+        listed = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True
+        ).stdout
+    except OSError:
+        return "libx264"
+
+    for encoder in H264_ENCODERS:
+        if encoder == "libx264":
+            break
+        if f" {encoder} " in listed and _encoder_works(encoder):
+            return encoder
+    return "libx264"
+
+
+def h264_encoder_args(preferred: str = "auto") -> list:
+    """ffmpeg video codec arguments for the encoder chosen by get_h264_encoder"""
+    encoder = get_h264_encoder(preferred)
+    return ["-c:v", encoder, *H264_ENCODERS.get(encoder, [])]
+
+
+def _find_box(f, box_type: bytes, end: int):
+    """
+    Scan the ISO BMFF boxes from the current position up to end for one of box_type.
+    Returns the offset just past its header and the offset where it ends, or None.
+    """
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, found_type = struct.unpack(">I4s", f.read(8))
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = end - start
+        if size < 8:
+            return None
+        if found_type == box_type:
+            return f.tell(), start + size
+        f.seek(start + size)
+    return None
+
+
+def _mp4_duration(path: str) -> float:
+    """
+    Read an MP4/MOV duration from its moov/mvhd header without spawning ffprobe.
+    Returns 0 if there is no usable duration, such as in fragmented recordings
+    whose moov is written empty up front.
+    """
+    try:
+        with open(path, "rb") as f:
+            moov = _find_box(f, b"moov", os.fstat(f.fileno()).st_size)
+            if not moov:
+                return 0
+            mvhd = _find_box(f, b"mvhd", moov[1])
+            if not mvhd:
+                return 0
+            # version(1) flags(3), then creation/modification times, timescale, duration
+            if f.read(4)[0] == 1:
+                _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+            else:
+                _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+    except (OSError, struct.error, IndexError):
+        return 0
+    return duration / timescale if timescale else 0
+
+
+@lru_cache(maxsize=64)
+def _probe_duration(path: str, mtime_ns: int, size: int) -> float:
+    """Get a file's duration; mtime and size are only part of the cache key"""
+    if path.lower().endswith((".mp4", ".mov")):
+        duration = _mp4_duration(path)
+        if duration:
+            return duration
+
+    # float() accepts bytes and ignores surrounding whitespace
+    return float(subprocess.check_output([*FFPROBE_DURATION_CMD, path]))
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Size in bytes and duration in seconds of a video file"""
+
+    duration: float
+    size: int
+
+
+def probe(video_path, stat: Optional[os.stat_result] = None) -> MediaInfo:
+    """
+    Get a video's size and duration from a single stat and at most one ffprobe run.
+    Durations are cached per process, and a file that changed on disk is probed again.
+    Pass stat to reuse a stat result the caller already has.
+    """
+    if stat is None:
+        stat = os.stat(video_path)
+    path = os.path.abspath(video_path)
+    duration = _probe_duration(path, stat.st_mtime_ns, stat.st_size)
+    return MediaInfo(duration=duration, size=stat.st_size)
 
 
 def get_video_duration(input_path: str) -> str:
     """Get the duration of a video file using ffprobe"""
     try:
-        format_cmd = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-show_format",
-            "-show_streams",
-            "-print_format",
-            "json",
-            input_path,
-        ]
-
+        # Only the container duration is printed, so there is no JSON to build or parse
         process_result = subprocess.run(
-            format_cmd, capture_output=True, text=True, check=False
+            [*FFPROBE_DURATION_CMD, input_path],
+            capture_output=True,
+            text=True,
+            check=False,
         )
 
         if process_result.returncode != 0:
             print(f"FFprobe error: {process_result.stderr}")
 
-        try:
-            info = json.loads(process_result.stdout)
-            if "format" in info:
-                return f"Duration: {info['format'].get('duration', '00:00:00.00')}"
-        except json.JSONDecodeError as json_err:
-            print(f"Error parsing JSON from ffprobe: {json_err}")
-            # Fallback if JSON parsing fails
-            print("Using fallback method to get duration")
-            format_info = subprocess.run(
-                ["ffmpeg", "-i", input_path], capture_output=True, text=True
-            )
-            duration_match = re.search(
-                r"Duration: (\d+:\d+:\d+\.\d+)", format_info.stderr
-            )
-            if duration_match:
-                return f"Duration: {duration_match.group(1)}"
+        duration = process_result.stdout.strip()
+        if duration and duration != "N/A":
+            return f"Duration: {duration}"
+
+        # Fallback if ffprobe didn't report a duration
+        print("Using fallback method to get duration")
+        format_info = subprocess.run(
+            ["ffmpeg", "-i", input_path], capture_output=True, text=True
+        )
+        duration_match = _DURATION_RE.search(format_info.stderr)
+        if duration_match:
+            return f"Duration: {duration_match.group(1)}"
 
     except Exception as probe_err:
         print(f"Error running ffprobe: {probe_err}")
@@ -52,66 +214,83 @@ def get_video_duration(input_path: str) -> str:
     return "Duration: unknown"
 
 
-def split_video_by_size(video_path_input: str, max_size_gb: float = 1.9):
+def _split_parts(output_dir: Path, video_path: Path) -> list:
+    """List the consecutively numbered split parts of a video that exist on disk"""
+    # One directory listing instead of an exists() call per part
+    try:
+        with os.scandir(output_dir) as entries:
+            names = {entry.name for entry in entries}
+    except FileNotFoundError:
+        return []
+
+    parts = []
+    while True:
+        name = f"{video_path.stem}_part{len(parts) + 1}{video_path.suffix}"
+        if name not in names:
+            return parts
+        parts.append(output_dir / name)
+
+
+def split_video_by_size(
+    video_path_input: str, max_size_gb: float = 1.9, info: Optional[MediaInfo] = None
+):
     """
     Split a video file into chunks of specified maximum size.
 
     Args:
         video_path (str): Path to the input video file
         max_size_gb (float): Maximum size of each chunk in gigabytes (default: 1.9)
+        info (MediaInfo, optional): Probe result, if the caller already has one
     """
     video_path = Path(video_path_input)
-    if not video_path.exists():
-        raise FileNotFoundError(f"Video file not found: {video_path}")
 
-    # Calculate file size in GB
-    file_size_gb = os.path.getsize(video_path) / (1024**3)
-    num_segments = math.ceil(file_size_gb / max_size_gb)
+    # Calculate file size in bytes; the stat doubles as the existence check
+    # and is handed to probe() below, so the file is stat'ed at most once
+    stat = None
+    if info is None:
+        try:
+            stat = video_path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Video file not found: {video_path}") from None
+    file_size = info.size if info else stat.st_size
+    # Ceiling division on byte counts, so sizes right at the limit aren't off by one
+    max_size = int(max_size_gb * (1024**3))
+    num_segments = max(1, -(-file_size // max_size))
     output_dir = video_path.parent / f"{video_path.stem}_chunks"
 
-    if output_dir.exists():
-        expected_files = [
-            output_dir / f"{video_path.stem}_part{i + 1}{video_path.suffix}"
-            for i in range(num_segments)
-        ]
-        if all(file.exists() for file in expected_files):
-            return expected_files
+    existing_files = _split_parts(output_dir, video_path)
+    if len(existing_files) >= num_segments:
+        return existing_files
 
     output_dir.mkdir(exist_ok=True)
-    list_of_created_files = []
 
-    # Get video duration using ffprobe
-    duration_cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
+    # Only probed once a split is actually needed
+    if info is None:
+        info = probe(video_path, stat)
+
+    # The segment muxer writes every part in a single pass over the input,
+    # numbered from 1 to match the _part{n} names callers expect
+    segment_duration = info.duration / num_segments
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i",
         str(video_path),
+        "-map",
+        "0",
+        "-c",
+        "copy",
+        "-f",
+        "segment",
+        "-segment_time",
+        str(segment_duration),
+        "-segment_start_number",
+        "1",
+        "-reset_timestamps",
+        "1",
+        str(output_dir / f"{video_path.stem}_part%d{video_path.suffix}"),
     ]
-    duration = float(subprocess.check_output(duration_cmd).decode().strip())
-
-    segment_duration = duration / num_segments
-    for i in range(num_segments):
-        start_time = i * segment_duration
-        output_path = output_dir / f"{video_path.stem}_part{i + 1}{video_path.suffix}"
-        list_of_created_files.append(output_path)
-
-        cmd = [
-            "ffmpeg",
-            "-i",
-            str(video_path),
-            "-ss",
-            str(start_time),
-            "-t",
-            str(segment_duration),
-            "-c",
-            "copy",
-            str(output_path),
-        ]
-
-        subprocess.run(cmd, check=True)
-
-    return list_of_created_files
+    subprocess.run(cmd, check=True)
+
+    # Segments are cut on keyframes, so the count can differ slightly from num_segments
+    return _split_parts(output_dir, video_path)